@@ -8,8 +8,7 @@ from grpc_frog._version import get_versions
 from grpc_frog.core.context import context
 from grpc_frog.core.frog import frog
 from grpc_frog.core.servicer import Servicer
-from grpc_frog.generator.proto_to_python import generate_py_code
-from grpc_frog.generator.python_to_proto import generate_proto_file
+from grpc_frog.generator import generate_proto_file, generate_py_code
 
 __version__ = get_versions()["version"]
 del get_versions
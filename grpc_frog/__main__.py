@@ -2,31 +2,138 @@
 # encoding: utf-8
 # Created by zza on 2021/1/13 15:31
 # Copyright 2021 LinkSense Technology CO,. Ltd
+import ast
+import importlib
+import logging
 import os
+import sys
 
 import fire
 
+log = logging.getLogger("grpc_frog")
 
-def generate_proto_file(servicer_name: str = None) -> None:
+# 查找servicer时跳过的目录
+_skip_dirs = {"__pycache__", "build", "dist", "node_modules", "site-packages", "venv"}
+
+
+def generate_proto_file(
+    servicer_name: str = None,
+    batch: bool = False,
+    workers: int = None,
+    modules=None,
+) -> None:
     """生成proto文件
-    建议不要用命令行生成，import 容易出现error
+    :param servicer_name: 服务名称 默认生成全部
+    :param batch: 同一目录的多个proto文件只调用一次protoc
+    :param workers: 并行编译proto文件的进程数
+    :param modules: 定义servicer的模块 e.g. app.servicer,app/api.py 逗号分隔或列表
+        默认读取 pyproject.toml 中 [tool.grpc_frog] modules
+        都没有时在当前目录中查找 import 了 grpc_frog 的文件
     """
-    modules = []
-    for root, _, filenames in os.walk(os.getcwd()):
-        for filename in filenames:
-            if filename.startswith(".") or not filename.endswith(".py"):
-                continue
-            path = os.path.join(root, filename)
-            modules.append(path)
-    for py_file in sorted(modules):
+    root = os.getcwd()
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    module_names = _split_modules(modules) or _get_pyproject_modules(root)
+    if not module_names:
+        module_names = [_path_to_module(root, i) for i in _find_frog_files(root)]
+    for module_name in module_names:
         try:
-            exec(open(py_file, "r", encoding="utf8").read())
+            _import_module(root, module_name)
         except Exception as err:
-            print("import err on {}\nerr:{}".format(py_file, err))
+            log.warning("import err on {}\nerr:{}".format(module_name, err))
 
     from grpc_frog import generate_proto_file as _generate_proto_file
 
-    _generate_proto_file(servicer_name)
+    _generate_proto_file(servicer_name, batch=batch, workers=workers)
+
+
+def _split_modules(modules) -> list:
+    if not modules:
+        return []
+    if isinstance(modules, str):
+        modules = modules.split(",")
+    return [i.strip() for i in modules if i.strip()]
+
+
+def _get_pyproject_modules(root: str) -> list:
+    """pyproject.toml 中的 [tool.grpc_frog] modules"""
+    pyproject = os.path.join(root, "pyproject.toml")
+    if not os.path.exists(pyproject):
+        return []
+    try:
+        import tomllib
+    except ImportError:  # python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            log.warning("读取 pyproject.toml 需要安装 tomli")
+            return []
+    with open(pyproject, "rb") as f:
+        config = tomllib.load(f)
+    return _split_modules(config.get("tool", {}).get("grpc_frog", {}).get("modules"))
+
+
+def _find_frog_files(root: str) -> list:
+    """
+    当前目录中引用了grpc_frog的py文件
+    只读取和解析源码 不执行; 跳过隐藏目录和虚拟环境
+    """
+    ret = []
+    for dir_path, dir_names, filenames in os.walk(root):
+        dir_names[:] = sorted(
+            i
+            for i in dir_names
+            if not i.startswith(".")
+            and i not in _skip_dirs
+            and not os.path.exists(os.path.join(dir_path, i, "pyvenv.cfg"))
+        )
+        for filename in sorted(filenames):
+            if filename.startswith(".") or not filename.endswith(".py"):
+                continue
+            path = os.path.join(dir_path, filename)
+            if _imports_grpc_frog(path):
+                ret.append(path)
+    return ret
+
+
+def _imports_grpc_frog(path: str) -> bool:
+    """源码中是否 import 了 grpc_frog"""
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+        # 大部分文件在这里就被排除 不需要解析
+        if b"grpc_frog" not in source:
+            return False
+        tree = ast.parse(source, filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [i.name for i in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module or ""]
+        else:
+            continue
+        if any(i == "grpc_frog" or i.startswith("grpc_frog.") for i in names):
+            return True
+    return False
+
+
+def _path_to_module(root: str, path: str) -> str:
+    """文件地址 -> 模块名 e.g. app/api.py -> app.api"""
+    module_path = os.path.relpath(path, root)[: -len(".py")]
+    parts = module_path.split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _import_module(root: str, module_name: str):
+    """导入模块 也可以是.py文件地址"""
+    if module_name.endswith(".py"):
+        module_name = _path_to_module(root, os.path.abspath(module_name))
+    return importlib.import_module(module_name)
+
 
 
 def clear_proto_cache() -> None:
@@ -36,14 +143,17 @@ def clear_proto_cache() -> None:
     frog.clear_proto_cache()
 
 
-def generate_client_code(package_dir: str, pb_file_dir: str = None) -> None:
+def generate_client_code(
+    package_dir: str, pb_file_dir: str = None, format: str = "black"  # noqa: A002
+) -> None:
     """生成client包文件
     :param package_dir: client文件生成地址
     :param pb_file_dir: pb file文件所在目录
+    :param format: 格式化方式 black / none
     """
     from grpc_frog import generate_py_code
 
-    generate_py_code(package_dir, pb_file_dir)
+    generate_py_code(package_dir, pb_file_dir, format=format)
 
 
 def entry_point() -> None:  # pragma: no cover
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+client端的负载均衡策略
+
+* 每个服务地址(target)在连接池中对应一个长连接 策略只负责选择target
+* update 在服务列表变化时调用, pick 在每次调用前选择target
+* on_start/on_done 记录每个target进行中的请求数和延迟 供策略使用
+"""
+import bisect
+import ipaddress
+import itertools
+import json
+import logging
+import random
+import socket
+import threading
+import time
+
+log = logging.getLogger("grpc_frog")
+
+# 延迟指数加权平均的衰减系数 越大越看重最近的请求
+_ewma_decay = 0.3
+
+
+def get_weight(server: dict) -> float:
+    """
+    服务的权重: 注册的weight 按剩余容量缩小
+    server上报了 inflight(进行中请求数) 和 capacity(容量) 时, 满载的服务权重降到5%
+    """
+    weight = float(server.get("weight") or 1)
+    capacity = server.get("capacity")
+    inflight = server.get("inflight")
+    if capacity and inflight is not None:
+        weight *= max(1 - float(inflight) / float(capacity), 0.05)
+    return weight
+
+
+def get_target(server: dict) -> str:
+    """服务信息 -> host:port ipv6地址写在[]中"""
+    host = str(server.get("host"))
+    if ":" in host and not host.startswith("["):
+        host = "[{}]".format(host)
+    return "{}:{}".format(host, server.get("port"))
+
+
+class Balancer:
+    """负载均衡策略基类 随机选择"""
+
+    # 使用该策略时 channel额外的options
+    channel_options = []
+
+    def __init__(self):
+        self._targets = ()  # 可用target的快照 pick时不加锁
+        self._weights = {}  # target : 权重 见get_weight
+        self._outstanding = {}  # target : 进行中的请求数
+        self._latency = {}  # target : 延迟的指数加权平均(秒) 没有请求时为0
+        self._lock = threading.Lock()
+
+    def update(self, servers):
+        """
+        服务列表变化
+        :param servers: [{"host": str, "port": int, "weight": float}]
+            可选的server上报数据 capacity、inflight、latency_ms 见 get_weight
+        """
+        weights = {get_target(i): get_weight(i) for i in servers}
+        # server上报的延迟 client还没有数据时使用
+        reported = {
+            get_target(i): float(i["latency_ms"]) / 1000
+            for i in servers
+            if i.get("latency_ms")
+        }
+        with self._lock:
+            # 仍在线的target保留统计数据
+            self._outstanding = {i: self._outstanding.get(i, 0) for i in weights}
+            self._latency = {
+                i: self._latency.get(i) or reported.get(i, 0.0) for i in weights
+            }
+            self._weights = weights
+        # 可能需要解析DNS 不占用统计数据的锁
+        self._on_update(tuple(weights))
+        self._targets = tuple(weights)
+
+    def _on_update(self, targets: tuple):
+        """服务列表变化时 子类预先计算选择用的数据"""
+
+    def targets(self) -> tuple:
+        """当前全部可用的target"""
+        return self._targets
+
+    def pick(self) -> str:
+        """选择本次调用的target"""
+        targets = self._targets
+        if not targets:
+            raise IndexError("没有可用的服务地址")
+        if len(targets) == 1:
+            return targets[0]
+        return self._choose(targets)
+
+    def _choose(self, targets: tuple) -> str:
+        return random.choice(targets)
+
+    def on_start(self, target: str) -> float:
+        """请求开始 返回开始时间"""
+        with self._lock:
+            if target in self._outstanding:
+                self._outstanding[target] += 1
+        return time.perf_counter()
+
+    def on_done(self, target: str, start: float):
+        """请求结束 更新进行中的请求数和延迟"""
+        latency = time.perf_counter() - start
+        with self._lock:
+            if target not in self._outstanding:
+                # 请求期间服务已下线
+                return
+            self._outstanding[target] -= 1
+            old = self._latency[target]
+            self._latency[target] = (
+                latency if old == 0 else old + _ewma_decay * (latency - old)
+            )
+
+
+class RoundRobinBalancer(Balancer):
+    """轮询"""
+
+    def __init__(self):
+        super().__init__()
+        self._counter = itertools.count()
+
+    def _choose(self, targets):
+        return targets[next(self._counter) % len(targets)]
+
+
+class LeastOutstandingBalancer(Balancer):
+    """选择 进行中请求数/权重 最小的target 相同时随机"""
+
+    def _choose(self, targets):
+        load = {
+            i: (self._outstanding.get(i, 0) + 1) / self._weights.get(i, 1)
+            for i in targets
+        }
+        least = min(load.values())
+        return random.choice([i for i in targets if load[i] == least])
+
+
+class PowerOfTwoBalancer(Balancer):
+    """
+    随机选两个target 取 延迟 * (进行中请求数 + 1) / 权重 较小的一个
+    还没有延迟数据的target优先 用于探测新上线的服务
+    """
+
+    def _choose(self, targets):
+        a, b = random.sample(targets, 2)
+        return a if self._score(a) <= self._score(b) else b
+
+    def _score(self, target) -> float:
+        return (
+            self._latency.get(target, 0.0)
+            * (self._outstanding.get(target, 0) + 1)
+            / self._weights.get(target, 1)
+        )
+
+
+class WeightedBalancer(Balancer):
+    """按权重随机 权重见 get_weight"""
+
+    def __init__(self):
+        super().__init__()
+        self._cumulative = ([], ())  # (累计权重, targets)
+
+    def _on_update(self, targets):
+        self._cumulative = (
+            list(itertools.accumulate(self._weights[i] for i in targets)),
+            targets,
+        )
+
+    def _choose(self, targets):
+        cumulative, targets = self._cumulative
+        index = bisect.bisect_right(cumulative, random.random() * cumulative[-1])
+        return targets[min(index, len(targets) - 1)]
+
+
+class GrpcRoundRobinBalancer(Balancer):
+    """
+    由grpc自身做负载均衡
+    全部服务地址组成一个target(e.g. ipv4:10.0.0.1:1,10.0.0.2:2), 对应一个channel,
+    channel使用round_robin策略 在C core中为每个地址维护连接并按请求轮询
+    服务列表变化时target随之变化 连接池建立新的channel(grpc在channel之间复用到同一地址的连接)
+    """
+
+    channel_options = [
+        (
+            "grpc.service_config",
+            json.dumps({"loadBalancingConfig": [{"round_robin": {}}]}),
+        )
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self._channel_target = ()
+
+    def _on_update(self, targets):
+        addresses = []
+        for target in targets:
+            host, port = target.rsplit(":", 1)
+            addresses.extend(_resolve(host.strip("[]"), port))
+        self._channel_target = (_make_channel_target(addresses),) if addresses else ()
+
+    def targets(self):
+        return self._channel_target
+
+    def pick(self):
+        targets = self._channel_target
+        if not targets:
+            raise IndexError("没有可用的服务地址")
+        return targets[0]
+
+
+def _resolve(host: str, port: str) -> list:
+    """host -> [(ip_address, port)] 主机名通过DNS解析"""
+    try:
+        return [(ipaddress.ip_address(host), port)]
+    except ValueError:
+        pass
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as err:
+        log.warning("解析 {} 失败: {}".format(host, err))
+        return []
+    return sorted({(ipaddress.ip_address(i[4][0]), port) for i in infos})
+
+
+def _make_channel_target(addresses) -> str:
+    """
+    [(ip_address, port)] -> grpc的多地址target
+    ipv4和ipv6不能写在同一个target中 同时存在时只使用ipv4
+    """
+    ipv4 = [i for i in addresses if i[0].version == 4]
+    if ipv4 and len(ipv4) != len(addresses):
+        log.warning("服务地址同时包含ipv4和ipv6 只使用ipv4地址")
+    if ipv4:
+        return "ipv4:" + ",".join("{}:{}".format(ip, port) for ip, port in ipv4)
+    return "ipv6:" + ",".join("[{}]:{}".format(ip, port) for ip, port in addresses)
+
+
+balancers = {
+    "random": Balancer,
+    "round_robin": RoundRobinBalancer,
+    "least_outstanding": LeastOutstandingBalancer,
+    "p2c_ewma": PowerOfTwoBalancer,
+    "weighted": WeightedBalancer,
+    "grpc_round_robin": GrpcRoundRobinBalancer,
+}
+
+
+def create_balancer(lb_policy="random") -> Balancer:
+    """
+    创建负载均衡策略
+    :param lb_policy: balancers中的名字 或 Balancer子类
+    """
+    if isinstance(lb_policy, str):
+        if lb_policy not in balancers:
+            raise ValueError(
+                "lb_policy 错误 请选择 {}".format("|".join(balancers.keys()))
+            )
+        lb_policy = balancers[lb_policy]
+    return lb_policy()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+ChannelPool client端的channel连接池
+"""
+import threading
+
+import grpc
+
+
+class ChannelPool:
+    """
+    channel连接池
+
+    * 一个target(ip:port)对应一个长连接channel和stub
+    * 多线程共享 channel本身是线程安全的
+    * 关闭时释放全部连接
+    * aio=True 时使用 grpc.aio channel, 只能在创建它的事件循环中使用
+    """
+
+    def __init__(self, stub_factory, options=None, aio=False):
+        """
+        :param stub_factory: 传入channel 返回stub的函数 e.g. pb2_grpc.xxxStub
+        :param options: grpc channel_options
+        :param aio: 是否使用 grpc.aio channel
+        """
+        self._stub_factory = stub_factory
+        self._options = options or []
+        self._channel_factory = (
+            grpc.aio.insecure_channel if aio else grpc.insecure_channel
+        )
+        self._channels = {}  # target : channel
+        self._stubs = {}  # target : stub
+        self._lock = threading.Lock()
+
+    def get_channel(self, target: str) -> grpc.Channel:
+        """获取target对应的channel 没有则新建"""
+        channel = self._channels.get(target)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.get(target)
+                if channel is None:
+                    channel = self._channel_factory(target, options=self._options)
+                    self._channels[target] = channel
+        return channel
+
+    def get_stub(self, target: str):
+        """获取target对应的stub 没有则新建"""
+        stub = self._stubs.get(target)
+        if stub is None:
+            channel = self.get_channel(target)
+            with self._lock:
+                stub = self._stubs.get(target)
+                if stub is None:
+                    stub = self._stub_factory(channel)
+                    self._stubs[target] = stub
+        return stub
+
+    def targets(self):
+        """当前已建立连接的target"""
+        return list(self._channels.keys())
+
+    def evict(self, targets) -> list:
+        """移除不在targets中的连接 返回被移除的channel(由调用方关闭)"""
+        targets = set(targets)
+        with self._lock:
+            removed = [i for i in self._channels if i not in targets]
+            channels = [self._channels.pop(i) for i in removed]
+            for target in removed:
+                self._stubs.pop(target, None)
+        return channels
+
+    def retain(self, targets):
+        """只保留targets对应的连接 关闭其余channel"""
+        for channel in self.evict(targets):
+            channel.close()
+
+    def _pop_channels(self):
+        with self._lock:
+            channels = list(self._channels.values())
+            self._channels.clear()
+            self._stubs.clear()
+        return channels
+
+    def close(self):
+        """关闭所有channel"""
+        for channel in self._pop_channels():
+            channel.close()
+
+    async def aclose(self):
+        """关闭所有aio channel"""
+        for channel in self._pop_channels():
+            await channel.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+model对应的编解码器
+
+message_to_dict/dict_to_message 每次调用都要递归判断字段类型
+这里在第一次使用时把model的结构编译成一组字段操作, 调用时只顺序执行
+"""
+import datetime
+import threading
+
+from pydantic import BaseModel
+
+from grpc_frog.core import proto_type_recorder
+
+# 不需要转换的基本类型
+_plain_type = (int, str, bool, float)
+
+_codecs = {}  # py_type : Codec
+_lock = threading.RLock()
+
+
+class Codec:
+    """
+    一个model的编解码器
+
+    encode: dict/model -> CMessage
+    decode: CMessage -> dict
+    to_obj: CMessage -> model
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._encoders = []  # [(field_name, func(message, value))]
+        self._decoders = []  # [(field_name, func(message_value) -> py_value)]
+        self._build = None  # func(message) -> model
+
+    def encode(self, data, message):
+        """将dict或者model填入CMessage"""
+        if not isinstance(data, dict):
+            if not hasattr(data, "dict"):
+                raise TypeError(
+                    "{}对象实现错误 没有dict方法，请检查输入".format(type(data))
+                )
+            data = data.dict()
+        for name, encoder in self._encoders:
+            value = data.get(name)
+            if value is not None:
+                encoder(message, value)
+        return message
+
+    def decode(self, message) -> dict:
+        """将CMessage转换成dict"""
+        return {
+            name: decoder(getattr(message, name)) for name, decoder in self._decoders
+        }
+
+    def to_obj(self, message):
+        """将CMessage转换成model对象"""
+        return self._build(message)
+
+
+def get_codec(model) -> Codec:
+    """获取model的编解码器 第一次获取时编译"""
+    codec = _codecs.get(model)
+    if codec is None:
+        with _lock:
+            codec = _codecs.get(model)
+            if codec is None:
+                pending = {}
+                codec = _compile(model, pending)
+                # 全部编译完成后再发布 避免其他线程拿到未编译完的codec
+                _codecs.update(pending)
+    return codec
+
+
+def clear_codec_cache():
+    """model结构变化后清空已编译的codec"""
+    with _lock:
+        _codecs.clear()
+
+
+def _get_nested(model, pending) -> Codec:
+    """编译期间获取嵌套model的codec, 循环引用时返回正在编译的codec"""
+    return _codecs.get(model) or pending.get(model) or _compile(model, pending)
+
+
+def _compile(model, pending) -> Codec:
+    codec = Codec(model)
+    pending[model] = codec
+    for name, py_type in proto_type_recorder.message_collections[model].items():
+        if isinstance(py_type, list):
+            encoder, decoder = _compile_list(name, py_type[0], pending)
+        elif isinstance(py_type, dict):
+            (_, value_type), *_ = py_type.items()
+            encoder, decoder = _compile_dict(name, value_type, pending)
+        else:
+            encoder, decoder = _compile_field(name, py_type, pending)
+        codec._encoders.append((name, encoder))
+        codec._decoders.append((name, decoder))
+    codec._build = _compile_build(codec)
+    return codec
+
+
+def _compile_build(codec: Codec):
+    """生成 CMessage -> model 的函数"""
+    model = codec.model
+    decode = codec.decode
+    if issubclass(model, BaseModel):
+        construct = model.construct
+        return lambda message: construct(**decode(message))
+    if proto_type_recorder.is_sqlalchemy_model(model):
+
+        def build(message):
+            obj = model()
+            for name, value in decode(message).items():
+                setattr(obj, name, value)
+            return obj
+
+        return build
+    # 其他类型使用注册时的from_orm方法
+    return proto_type_recorder._converter[model]
+
+
+def _scalar_decoder(py_type):
+    """基本类型的解码函数 不需要转换时返回None"""
+    if py_type in _plain_type:
+        return None
+    if py_type is datetime.datetime:
+        return lambda value: datetime.datetime.fromtimestamp(value.seconds)
+    # 用户自定义的类型 调用时再查找
+    return lambda value: proto_type_recorder._converter[py_type](value)
+
+
+def _compile_field(name, py_type, pending):
+    if py_type in proto_type_recorder.message_collections:
+        nested = _get_nested(py_type, pending)
+
+        def encoder(message, value):
+            nested.encode(value, getattr(message, name))
+
+        if nested._build is None:
+            # 循环引用(正在编译的model): 未设置的子message解码为None 否则会无限展开
+            to_obj = nested.to_obj
+            return encoder, lambda value: to_obj(value) if value.ByteSize() else None
+        return encoder, nested.to_obj
+
+    reverse = proto_type_recorder.converter_reverse.get(py_type)
+    if reverse is proto_type_recorder.default_converter_reverse:
+
+        def encoder(message, value):
+            setattr(message, name, value)
+
+    elif py_type is datetime.datetime:
+
+        def encoder(message, value):
+            getattr(message, name).FromDatetime(value)
+
+    else:
+
+        def encoder(message, value):
+            proto_type_recorder.converter_proto(py_type, message, name, value)
+
+    return encoder, _scalar_decoder(py_type) or _identity
+
+
+def _compile_list(name, item_type, pending):
+    if item_type in proto_type_recorder.message_collections:
+        nested = _get_nested(item_type, pending)
+        nested_encode, to_obj = nested.encode, nested.to_obj
+
+        def encoder(message, value):
+            field = getattr(message, name)
+            for item in value:
+                nested_encode(item, field.add())
+
+        return encoder, lambda field: [to_obj(item) for item in field]
+
+    if item_type is datetime.datetime:
+
+        def encoder(message, value):
+            field = getattr(message, name)
+            for item in value:
+                field.add().FromDatetime(item)
+
+    else:
+
+        def encoder(message, value):
+            getattr(message, name).extend(value)
+
+    item_decoder = _scalar_decoder(item_type)
+    if item_decoder is None:
+        return encoder, list
+    return encoder, lambda field: [item_decoder(item) for item in field]
+
+
+def _compile_dict(name, value_type, pending):
+    # proto map 的 key 只能是基本类型
+    if value_type in proto_type_recorder.message_collections:
+        nested = _get_nested(value_type, pending)
+        nested_encode, to_obj = nested.encode, nested.to_obj
+
+        def encoder(message, value):
+            field = getattr(message, name)
+            for key, item in value.items():
+                nested_encode(item, field[key])
+
+        return encoder, lambda field: {k: to_obj(v) for k, v in field.items()}
+
+    if value_type is datetime.datetime:
+
+        def encoder(message, value):
+            field = getattr(message, name)
+            for key, item in value.items():
+                field[key].FromDatetime(item)
+
+    else:
+
+        def encoder(message, value):
+            getattr(message, name).update(value)
+
+    item_decoder = _scalar_decoder(value_type)
+    if item_decoder is None:
+        return encoder, dict
+    return encoder, lambda field: {k: item_decoder(v) for k, v in field.items()}
+
+
+def _identity(value):
+    return value
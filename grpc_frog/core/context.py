@@ -5,12 +5,21 @@
 """
 Context 当前上下文
 """
+import contextvars
 import logging
 
+# (method, request_message, request_model, response_model, rpc_context)
+# 用tuple保存 fill只需要一次ContextVar.set
+_empty_state = (None, None, None, None, None)
+_current_state = contextvars.ContextVar("grpc_frog_context", default=_empty_state)
+
 
 class Context:
     """
-    保存当前(最后grpc调用的)上下文
+    保存当前请求的上下文
+
+    数据保存在contextvars中 每个线程/协程只能看到自己正在处理的请求
+    请求结束后恢复为上一层的上下文 不会持有已结束请求的CMessage
 
     method: 调用函数
     request_message: 请求参数 CMessage
@@ -19,30 +28,44 @@ class Context:
     rpc_context:  GrpcStub(Client) or GrpcContext(Server)
     """
 
-    def __init__(self):
-        self.method = None
-        self.request_message = None
-        self.request_model = None
-        self.response_model = None
-        self.rpc_context = None
+    @property
+    def method(self):
+        return _current_state.get()[0]
+
+    @property
+    def request_message(self):
+        return _current_state.get()[1]
+
+    @property
+    def request_model(self):
+        return _current_state.get()[2]
+
+    @property
+    def response_model(self):
+        return _current_state.get()[3]
+
+    @property
+    def rpc_context(self):
+        return _current_state.get()[4]
 
     def clear(self):
         """ 清理缓存 """
-        self.method = None
-        self.request_message = None
-        self.request_model = None
-        self.response_model = None
-        self.rpc_context = None
+        _current_state.set(_empty_state)
 
     def fill(self, method, request_message, request_model, response_model, rpc_context):
-        """ 装填数据 """
-        # 释放全局
-        self.clear()
-        self.method = method
-        self.request_message = request_message
-        self.request_model = request_model
-        self.response_model = response_model
-        self.rpc_context = rpc_context
+        """ 装填数据 返回的token用于请求结束时reset """
+        return _current_state.set(
+            (method, request_message, request_model, response_model, rpc_context)
+        )
+
+    def reset(self, token):
+        """ 请求结束 恢复到fill之前的上下文 """
+        try:
+            _current_state.reset(token)
+        except ValueError:
+            # token不属于当前contextvars.Context(如生成器在其他线程中被关闭)
+            # 此时当前上下文属于其他请求 不能覆盖
+            pass
 
 
 context = Context()
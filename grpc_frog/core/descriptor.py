@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+不经过protoc 直接在内存中生成servicer的pb2/pb2_grpc
+
+由message_collections构建FileDescriptorProto, 放入独立的DescriptorPool,
+再用message_factory生成CMessage类, 用generic handler注册服务
+生成的对象与protoc生成的 _pb2.py / _pb2_grpc.py 模块接口一致
+"""
+import types
+
+import grpc
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf import timestamp_pb2
+
+from grpc_frog.core import proto_type_recorder
+
+_field = descriptor_pb2.FieldDescriptorProto
+
+# proto基本类型名 : FieldDescriptorProto.Type
+_scalar_type = {
+    "double": _field.TYPE_DOUBLE,
+    "float": _field.TYPE_FLOAT,
+    "int64": _field.TYPE_INT64,
+    "uint64": _field.TYPE_UINT64,
+    "int32": _field.TYPE_INT32,
+    "uint32": _field.TYPE_UINT32,
+    "bool": _field.TYPE_BOOL,
+    "string": _field.TYPE_STRING,
+    "bytes": _field.TYPE_BYTES,
+}
+
+# (client_streaming, server_streaming) : (channel方法名, handler工厂)
+_rpc_kind = {
+    (False, False): ("unary_unary", grpc.unary_unary_rpc_method_handler),
+    (False, True): ("unary_stream", grpc.unary_stream_rpc_method_handler),
+    (True, False): ("stream_unary", grpc.stream_unary_rpc_method_handler),
+    (True, True): ("stream_stream", grpc.stream_stream_rpc_method_handler),
+}
+
+
+def get_required_message_types(servicer) -> set:
+    """servicer所有method需要的message类型(不含基本类型)"""
+    required_proto_type = set()
+    for _method in servicer.bind_method_map.values():
+        required_proto_type.update(_method.py_type_set)
+    return required_proto_type - set(proto_type_recorder.proto_base_type.keys())
+
+
+def build_file_descriptor_proto(servicer) -> descriptor_pb2.FileDescriptorProto:
+    """由servicer中注册的method和model生成FileDescriptorProto"""
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="{}.proto".format(servicer.name),
+        package=servicer.name,
+        syntax="proto3",
+        dependency=[timestamp_pb2.DESCRIPTOR.name],
+    )
+    message_types = get_required_message_types(servicer)
+    message_names = sorted(
+        (proto_type_recorder._py_name_2_proto_name_map[i], i) for i in message_types
+    )
+    for message_name, py_type in message_names:
+        message_proto = file_proto.message_type.add(name=message_name)
+        struct = proto_type_recorder.message_collections[py_type]
+        for index, (name, py_field) in enumerate(struct.items()):
+            _add_field(servicer.name, message_proto, name, index + 1, py_field)
+
+    service_proto = file_proto.service.add(name=servicer.name)
+    for method in servicer.bind_method_map.values():
+        service_proto.method.add(
+            name=method.name,
+            input_type=_type_name(servicer.name, method.request_name),
+            output_type=_type_name(servicer.name, method.response_name),
+            client_streaming=method.request_streaming,
+            server_streaming=method.response_streaming,
+        )
+    return file_proto
+
+
+def _type_name(package, proto_name):
+    """message的全名 e.g. .hello_d.TDemoModel .google.protobuf.Timestamp"""
+    if "." in proto_name:
+        return "." + proto_name
+    return ".{}.{}".format(package, proto_name)
+
+
+def _set_field_type(package, field_proto, py_type):
+    proto_name = proto_type_recorder._py_name_2_proto_name_map[py_type]
+    if proto_name in _scalar_type:
+        field_proto.type = _scalar_type[proto_name]
+    else:
+        field_proto.type = _field.TYPE_MESSAGE
+        field_proto.type_name = _type_name(package, proto_name)
+
+
+def _add_field(package, message_proto, name, number, py_field):
+    field_proto = message_proto.field.add(name=name, number=number)
+    field_proto.label = _field.LABEL_OPTIONAL
+    if isinstance(py_field, list):
+        field_proto.label = _field.LABEL_REPEATED
+        _set_field_type(package, field_proto, py_field[0])
+    elif isinstance(py_field, dict):
+        # map<k, v> 是一个 repeated 的 XxxEntry 嵌套message
+        (key_type, value_type), *_ = py_field.items()
+        entry_name = "".join(i.capitalize() for i in name.split("_")) + "Entry"
+        entry_proto = message_proto.nested_type.add(name=entry_name)
+        entry_proto.options.map_entry = True
+        _add_field(package, entry_proto, "key", 1, key_type)
+        _add_field(package, entry_proto, "value", 2, value_type)
+        field_proto.label = _field.LABEL_REPEATED
+        field_proto.type = _field.TYPE_MESSAGE
+        field_proto.type_name = ".{}.{}.{}".format(
+            package, message_proto.name, entry_name
+        )
+    else:
+        _set_field_type(package, field_proto, py_field)
+
+
+def _get_message_class(descriptor):
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(descriptor)
+    # protobuf < 4.21
+    return message_factory.MessageFactory(descriptor.file.pool).GetPrototype(descriptor)
+
+
+def build_pb2_modules(servicer):
+    """
+    在内存中生成servicer的 (pb2, pb2_grpc)
+    接口与protoc生成的模块一致
+    """
+    file_proto = build_file_descriptor_proto(servicer)
+    pool = descriptor_pool.DescriptorPool()
+    timestamp_proto = descriptor_pb2.FileDescriptorProto()
+    timestamp_pb2.DESCRIPTOR.CopyToProto(timestamp_proto)
+    pool.Add(timestamp_proto)
+    pool.Add(file_proto)
+    file_descriptor = pool.FindFileByName(file_proto.name)
+
+    pb2 = types.ModuleType("{}_pb2".format(servicer.name))
+    pb2.DESCRIPTOR = file_descriptor
+    for message_name, descriptor in file_descriptor.message_types_by_name.items():
+        setattr(pb2, message_name, _get_message_class(descriptor))
+
+    service = file_descriptor.services_by_name[servicer.name]
+    pb2_grpc = types.ModuleType("{}_pb2_grpc".format(servicer.name))
+    setattr(pb2_grpc, "{}Stub".format(servicer.name), _make_stub_class(pb2, service))
+    setattr(pb2_grpc, "{}Servicer".format(servicer.name), _make_servicer_class(service))
+    setattr(
+        pb2_grpc,
+        "add_{}Servicer_to_server".format(servicer.name),
+        _make_add_to_server(pb2, service),
+    )
+    return pb2, pb2_grpc
+
+
+def _method_io(pb2, method):
+    return (
+        getattr(pb2, method.input_type.name),
+        getattr(pb2, method.output_type.name),
+    )
+
+
+def _make_stub_class(pb2, service):
+    def __init__(self, channel):
+        for method in service.methods:
+            request, response = _method_io(pb2, method)
+            channel_method, _ = _rpc_kind[
+                (method.client_streaming, method.server_streaming)
+            ]
+            multicallable = getattr(channel, channel_method)(
+                "/{}/{}".format(service.full_name, method.name),
+                request_serializer=request.SerializeToString,
+                response_deserializer=response.FromString,
+            )
+            setattr(self, method.name, multicallable)
+
+    return type("{}Stub".format(service.name), (object,), {"__init__": __init__})
+
+
+def _unimplemented(request, context):
+    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+    context.set_details("Method not implemented!")
+    raise NotImplementedError("Method not implemented!")
+
+
+def _make_servicer_class(service):
+    methods = {method.name: staticmethod(_unimplemented) for method in service.methods}
+    return type("{}Servicer".format(service.name), (object,), methods)
+
+
+def _make_add_to_server(pb2, service):
+    def add_servicer_to_server(servicer, server):
+        handlers = {}
+        for method in service.methods:
+            request, response = _method_io(pb2, method)
+            _, handler_factory = _rpc_kind[
+                (method.client_streaming, method.server_streaming)
+            ]
+            handlers[method.name] = handler_factory(
+                getattr(servicer, method.name),
+                request_deserializer=request.FromString,
+                response_serializer=response.SerializeToString,
+            )
+        generic_handler = grpc.method_handlers_generic_handler(
+            service.full_name, handlers
+        )
+        server.add_generic_rpc_handlers((generic_handler,))
+
+    return add_servicer_to_server
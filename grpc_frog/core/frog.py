@@ -2,13 +2,14 @@
 # encoding: utf-8
 # Created by zza on 2021/1/15 11:00
 # Copyright 2021 LinkSense Technology CO,. Ltd
+import inspect
 import os
-import re
 from typing import Dict
 
 import grpc
 
 from grpc_frog.core import proto_type_recorder
+from grpc_frog.core.resolver import get_servicer_name
 from grpc_frog.core.servicer import Servicer
 
 
@@ -56,11 +57,22 @@ class Frog:
         """
         装载servicer
 
-        :param server: grpc.server对象
+        :param server: grpc.server 或 grpc.aio.server 对象
         :param frog_servicer: grpc_frog.servicer对象
         :return: grpc.server对象
         """
-        pb2_grpc = frog_servicer.get_pb2_grpc(frog_servicer.proto_dir)
+        if not isinstance(server, grpc.aio.Server):
+            for method_name, _method in frog_servicer.bind_method_map.items():
+                if inspect.iscoroutinefunction(
+                    _method.func
+                ) or inspect.isasyncgenfunction(_method.func):
+                    raise TypeError(
+                        "{}.{} 是async函数, 请使用grpc.aio.server".format(
+                            frog_servicer.name, method_name
+                        )
+                    )
+        frog_servicer.warmup()
+        pb2_grpc = frog_servicer.get_pb2_grpc()
         # bp_grpc get servicer
         servicer_name = "{}Servicer".format(frog_servicer.name)
         servicer_grpc = getattr(pb2_grpc, servicer_name)
@@ -77,21 +89,21 @@ class Frog:
         dir_path = os.path.join(os.path.dirname(__file__), "../proto")
         file_list = os.listdir(dir_path)
         for i in file_list:
-            if (i.endswith(".py") or i.endswith(".proto")) and (i != "__init__.py"):
+            if i.endswith((".py", ".proto", ".proto.hash")) and (i != "__init__.py"):
                 os.remove(os.path.join(dir_path, i))
 
-    def client_init(self, uri, proto_dir=None):
+    def client_init(
+        self, uri, proto_dir=None, connect_timeout: float = None, lb_policy="random"
+    ):
         """
         client端初始化用
         :param uri: eg. grpc://127.0.0.1:5000 zookeeper://127.0.0.1:5000/servicer_name
+            file:// 没有servicer名称 请使用 frog[servicer_name].client_init
         :param proto_dir: servicer所使用的proto文件
+        :param connect_timeout: 预热时等待连接就绪的秒数 默认不等待
+        :param lb_policy: 多个服务地址时的负载均衡策略 见 grpc_frog.core.balancer
         """
-        match_obj = re.match(r"(\w*)://([\w.]*):(\d*)/?(\w*)", uri)
-        if match_obj is None:
-            raise ValueError(
-                "{}错误 e.g zookeeper://127.0.0.1:5000/servicer_name".format(uri)
-            )
-        *_, servicer_name = match_obj.groups()
+        servicer_name = get_servicer_name(uri)
         if servicer_name not in self.servicer_map.keys():
             raise ValueError(
                 "{}未在frog中注册,当前已组测服务为{}".format(
@@ -99,7 +111,29 @@ class Frog:
                 )
             )
         self._uri_map[servicer_name] = uri
-        self.servicer_map[servicer_name].client_init(uri, proto_dir)
+        self.servicer_map[servicer_name].client_init(
+            uri, proto_dir, connect_timeout, lb_policy
+        )
+
+    def warmup(self, servicer_name=None, connect_timeout: float = None) -> dict:
+        """
+        预热servicer bind_servicer/client_init 时会自动调用
+        :param servicer_name: 默认预热全部servicer
+        :param connect_timeout: 作为client端时 等待连接就绪的秒数
+        :return: {servicer_name: {step: seconds}}
+        """
+        names = [servicer_name] if servicer_name else list(self.servicer_map)
+        return {name: self.servicer_map[name].warmup(connect_timeout) for name in names}
+
+    def close(self):
+        """关闭所有servicer作为client端时建立的channel"""
+        for servicer in self.servicer_map.values():
+            servicer.close()
+
+    async def aclose(self):
+        """关闭当前事件循环中所有servicer的aio channel"""
+        for servicer in self.servicer_map.values():
+            await servicer.aclose()
 
     def __getitem__(self, servicer_name):
         if servicer_name not in self.servicer_map.keys():
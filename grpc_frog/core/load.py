@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+server端的负载统计
+
+每个servicer记录进行中的请求数和最近请求的平均耗时,
+注册到zookeeper时定期写入节点数据 供client端的负载均衡策略使用
+"""
+import threading
+import time
+
+from grpc_frog.core.balancer import _ewma_decay
+
+
+class LoadStats:
+    """进行中的请求数 和 耗时的指数加权平均"""
+
+    def __init__(self):
+        self.inflight = 0
+        self.latency = 0.0  # 秒 没有请求时为0
+        self._lock = threading.Lock()
+
+    def on_start(self) -> float:
+        """请求开始 返回开始时间"""
+        with self._lock:
+            self.inflight += 1
+        return time.perf_counter()
+
+    def on_done(self, start: float):
+        """请求结束"""
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.inflight -= 1
+            old = self.latency
+            self.latency = latency if old == 0 else old + _ewma_decay * (latency - old)
+
+    def snapshot(self) -> dict:
+        """写入服务信息的负载数据 latency_ms为毫秒"""
+        return {"inflight": self.inflight, "latency_ms": round(self.latency * 1000, 3)}
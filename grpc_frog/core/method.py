@@ -2,8 +2,10 @@
 # encoding: utf-8
 # Created by zza on 2021/1/19 18:25
 # Copyright 2021 LinkSense Technology CO,. Ltd
+import inspect
 
 from grpc_frog.core import proto_type_recorder
+from grpc_frog.core.codec import get_codec
 
 
 class Method:
@@ -19,6 +21,7 @@ class Method:
         self.func = func
         self.name = func.__name__
         self.servicer = servicer
+        self._plan = None  # _CallPlan 第一次调用时生成
 
         self._parse_request(request_model)
         self._parse_response(response_model)
@@ -31,14 +34,22 @@ class Method:
         解析返回体参数模型
         用户可以直接在函数末尾注明参数
         可以给dict和 pydantic model
+        返回值为 Iterator[Model] 时为stream接口 response_model为Model
         """
+        return_annotation = self.func.__annotations__.get("return")
+        self.response_streaming = (
+            proto_type_recorder.get_stream_type(return_annotation) is not None
+        )
         if response_model is None:  # 来自函数的注解
-            response_model = self.func.__annotations__["return"]
+            response_model = return_annotation
             # 可能给dict 和 pydantic model
             if response_model in proto_type_recorder.proto_base_type:
                 # base type
                 raise NotImplementedError("不支持基本类型作为返回值，(没有name)")
-            response_model = self.func.__annotations__["return"]
+        stream_type = proto_type_recorder.get_stream_type(response_model)
+        if stream_type is not None:
+            self.response_streaming = True
+            response_model = stream_type
 
         self.response_name = response_model.__name__
         self.response_model = response_model
@@ -52,12 +63,46 @@ class Method:
         如果有request_model, 则用model的注解
         """
         _fields = {k: v for k, v in self.func.__annotations__.items() if k != "return"}
-        _fields.update(self.servicer.request_extra_field_map)
+        self.request_streaming = False
+        self.request_stream_arg = None
+        stream_fields = {
+            k: proto_type_recorder.get_stream_type(v)
+            for k, v in _fields.items()
+            if proto_type_recorder.get_stream_type(v) is not None
+        }
+        if stream_fields:
+            # stream 请求: 唯一的参数为 Iterator[Model] 每个CMessage对应一个Model
+            if len(_fields) != 1:
+                raise NotImplementedError(
+                    "[{}] stream 请求只支持一个 Iterator[Model] 参数".format(self.name)
+                )
+            if request_model is not None:
+                raise NotImplementedError(
+                    "[{}] stream 请求的message由 Iterator[Model] 决定 不能指定request_model".format(
+                        self.name
+                    )
+                )
+            # 额外字段是按请求附加的 stream 请求无法携带 回调不会被触发
+            if self.servicer.request_extra_field_map:
+                raise NotImplementedError(
+                    "[{}] {} 注册了请求额外字段{} 不支持 stream 请求".format(
+                        self.name,
+                        self.servicer.name,
+                        list(self.servicer.request_extra_field_map),
+                    )
+                )
+            (self.request_stream_arg, request_model), *_ = stream_fields.items()
+            self.request_streaming = True
+        else:
+            _fields.update(self.servicer.request_extra_field_map)
+
         if request_model is None:
             request_model = proto_type_recorder.register_by_dict(
                 _fields, "{}_request".format(self.name)
             )
-        elif set(request_model.__annotations__.keys()) != set(_fields.keys()):
+        elif not self.request_streaming and set(
+            request_model.__annotations__.keys()
+        ) != set(_fields.keys()):
             raise NotImplementedError(
                 "[{}]该方法注入的{}与函数参数不同，记录失败".format(self.name, request_model)
             )
@@ -68,30 +113,98 @@ class Method:
             request_model, message_name=self.request_name
         )
 
+    def get_plan(self) -> "_CallPlan":
+        """ 调用所需的message类、codec和参数信息 只在第一次使用时生成 """
+        plan = self._plan
+        if plan is None:
+            plan = self._plan = _CallPlan(self)
+        return plan
+
+    def warmup(self):
+        """ 预先获取请求/响应的message类 编译codec """
+        self.get_plan()
+
+    def bind_arguments(self, args, kwargs) -> dict:
+        """
+        client端 将调用参数转换成 {参数名: 值}
+        与 inspect.signature(func).bind(*args, **kwargs).arguments 结果相同
+        """
+        plan = self.get_plan()
+        names = plan.arg_names
+        if names is not None and len(args) <= len(names):
+            arguments = dict(zip(names, args))
+            for key, value in kwargs.items():
+                if key in arguments or key not in plan.arg_name_set:
+                    break
+                arguments[key] = value
+            else:
+                if len(args) >= plan.required_count or all(
+                    i in arguments for i in names[: plan.required_count]
+                ):
+                    return arguments
+        # 参数不全或有 *args/**kwargs 等 交给inspect处理(参数错误时抛出TypeError)
+        return dict(plan.signature.bind(*args, **kwargs).arguments)
+
     def request_message_2_dict(self, request):
         """ 将grpc的CMessages对象换成成函数参数 """
-        struct_dict = proto_type_recorder.message_collections[self.request_model]
-        return proto_type_recorder.message_to_dict(request, struct_dict)
+        return self.get_plan().request_codec.decode(request)
 
     def response_message_2_dict(self, response):
         """ 将grpc的CMessages对象换成成函数参数 """
-        struct_dict = proto_type_recorder.message_collections[self.response_model]
-        return proto_type_recorder.message_to_dict(response, struct_dict)
+        return self.get_plan().response_codec.decode(response)
 
     def response_ret_2_message(self, return_data):
         """ 将函数返回体转换为CMessage """
-        if not isinstance(return_data, dict):
-            return_data = return_data.dict()
-        message = getattr(self.servicer.get_pb2(), self.response_name)()
-        return proto_type_recorder.dict_to_message(
-            return_data, message, self.response_model, self.servicer
-        )
+        plan = self.get_plan()
+        return plan.response_codec.encode(return_data, plan.response_class())
 
     def request_ret_2_message(self, return_data):
         """ 将函数返回体转换为CMessage """
-        if not isinstance(return_data, dict):
-            return_data = return_data.dict()
-        message = getattr(self.servicer.get_pb2(), self.request_name)()
-        return proto_type_recorder.dict_to_message(
-            return_data, message, self.request_model, self.servicer
-        )
+        plan = self.get_plan()
+        return plan.request_codec.encode(return_data, plan.request_class())
+
+    def request_messages_2_models(self, requests):
+        """ stream 请求: 将CMessage迭代器逐个转换成model """
+        to_obj = self.get_plan().request_codec.to_obj
+        if hasattr(requests, "__aiter__"):
+            return _async_map(to_obj, requests)
+        return (to_obj(request) for request in requests)
+
+    def request_models_2_messages(self, models):
+        """ stream 请求: 将model迭代器逐个转换成CMessage """
+        plan = self.get_plan()
+        message_class = plan.request_class
+        encode = plan.request_codec.encode
+
+        def to_message(model):
+            return encode(model, message_class())
+
+        if hasattr(models, "__aiter__"):
+            return _async_map(to_message, models)
+        return (to_message(model) for model in models)
+
+
+class _CallPlan:
+    """ Method每次调用都要用到的对象 生成一次后复用 """
+
+    def __init__(self, method: Method):
+        pb2 = method.servicer.get_pb2()
+        self.request_class = getattr(pb2, method.request_name)
+        self.response_class = getattr(pb2, method.response_name)
+        self.request_codec = get_codec(method.request_model)
+        self.response_codec = get_codec(method.response_model)
+
+        self.signature = inspect.signature(method.func)
+        parameters = list(self.signature.parameters.values())
+        # 只有普通参数时 直接按位置/名字对应 不经过Signature.bind
+        if all(i.kind == i.POSITIONAL_OR_KEYWORD for i in parameters):
+            self.arg_names = [i.name for i in parameters]
+        else:
+            self.arg_names = None
+        self.arg_name_set = frozenset(self.arg_names or ())
+        self.required_count = sum(1 for i in parameters if i.default is i.empty)
+
+
+async def _async_map(func, async_iterable):
+    async for item in async_iterable:
+        yield func(item)
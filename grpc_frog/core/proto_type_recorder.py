@@ -5,11 +5,13 @@
 """
 记录proto类型与python类型对应关系
 """
+import collections.abc
 import datetime
+import sys
+import typing
 from collections import defaultdict
 from typing import Type, Union
 
-import flask_sqlalchemy
 from google.protobuf.message import Message
 from pydantic import BaseModel
 
@@ -39,6 +41,16 @@ _converter = {
     datetime.datetime: lambda x: datetime.datetime.fromtimestamp(x.seconds),
 }
 
+# 流式(stream)的typing注解 e.g. Iterator[Model]
+_stream_origins = {
+    collections.abc.Iterator,
+    collections.abc.Iterable,
+    collections.abc.Generator,
+    collections.abc.AsyncIterator,
+    collections.abc.AsyncIterable,
+    collections.abc.AsyncGenerator,
+}
+
 _py_default_value = {
     "datetime.datetime": "datetime.datetime.now",
 }
@@ -61,9 +73,20 @@ converter_reverse = {
 }
 
 
+def is_sqlalchemy_model(py_type) -> bool:
+    """
+    是否为flask_sqlalchemy的model
+    不主动import flask_sqlalchemy: 定义了这类model的项目一定已经import过了
+    """
+    flask_sqlalchemy = sys.modules.get("flask_sqlalchemy")
+    if flask_sqlalchemy is None:
+        return False
+    return issubclass(py_type, flask_sqlalchemy.model.Model)
+
+
 def _converter_py_type(py_type, value):
     """ 将自CMessage的数据转换成python对象  """
-    if issubclass(py_type, (BaseModel, flask_sqlalchemy.model.Model)):
+    if issubclass(py_type, BaseModel) or is_sqlalchemy_model(py_type):
         obj = py_type()
         # obj 的属性结构
         struct = message_collections[py_type]
@@ -157,42 +180,80 @@ def register_py_type(
     message_name = message_name or model.__name__
     _py_name_2_proto_name_map[model] = message_name
 
-    message_collections[model] = annotations_to_dict(model.__annotations__)
+    message_collections[model] = annotations_to_dict(get_annotations(model))
     _converter[model] = getattr(model, from_orm_method)
 
     if old_model:
         _converter[old_model] = getattr(model, from_orm_method)
         _py_name_2_proto_name_map[old_model] = message_name
-        message_collections[old_model] = annotations_to_dict(model.__annotations__)
+        message_collections[old_model] = annotations_to_dict(get_annotations(model))
+
+    # 结构变化 已编译的codec失效
+    from grpc_frog.core.codec import clear_codec_cache
+
+    clear_codec_cache()
 
 
-def get_base_type(type_list):
+def get_base_type(type_list, _visited=None):
     """去除typing的List Dict"""
+    # 已经处理过的model 循环引用的model只处理一次
+    visited = set() if _visited is None else _visited
     ret_type_list = set()
     for py_type in type_list:
         if py_type in list(proto_base_type.keys()):
             ret_type_list.add(py_type)
             continue
         elif isinstance(py_type, list):
-            ret_type_list.update(get_base_type(py_type))
+            ret_type_list.update(get_base_type(py_type, visited))
             continue
         elif isinstance(py_type, dict):
-            ret_type_list.update(get_base_type(py_type.values()))
+            ret_type_list.update(get_base_type(py_type.values(), visited))
             continue
         elif str(py_type).startswith("typing.List[") or str(py_type).startswith(
             "typing.Dict["
         ):
-            ret_type_list.update(get_base_type(py_type.__args__))
+            ret_type_list.update(get_base_type(py_type.__args__, visited))
             continue
+        if py_type in visited:
+            continue
+        visited.add(py_type)
 
-        ret_type_list.update(get_base_type(py_type.__annotations__.values()))
+        ret_type_list.update(get_base_type(get_annotations(py_type).values(), visited))
         # for sqlalchemy model
         _struct = message_collections[py_type]
-        ret_type_list.update(get_base_type(_struct.values()))
+        ret_type_list.update(get_base_type(_struct.values(), visited))
         ret_type_list.add(py_type)
     return ret_type_list
 
 
+def _has_forward_ref(py_type) -> bool:
+    if isinstance(py_type, (str, typing.ForwardRef)):
+        return True
+    return any(_has_forward_ref(i) for i in getattr(py_type, "__args__", None) or ())
+
+
+def get_annotations(model) -> dict:
+    """
+    model的注解
+    循环引用的model使用字符串形式的前向引用 e.g. children: List["Node"]
+    这里按model所在模块解析为实际类型
+    """
+    annotations = model.__annotations__
+    if not any(_has_forward_ref(i) for i in annotations.values()):
+        return annotations
+    module = sys.modules.get(model.__module__)
+    # 只解析model自身的注解 不包含父类(pydantic.BaseModel)的注解
+    holder = type(model.__name__, (), {"__annotations__": dict(annotations)})
+    return typing.get_type_hints(holder, globalns=getattr(module, "__dict__", None))
+
+
+def get_stream_type(py_type):
+    """Iterator[Model] 这类流式注解返回Model 其他类型返回None"""
+    if getattr(py_type, "__origin__", None) in _stream_origins:
+        return py_type.__args__[0]
+    return None
+
+
 def register_by_dict(struct, proto_name):
     """将一个dict数据加入frog"""
 
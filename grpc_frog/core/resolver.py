@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+client端的服务发现
+
+uri 格式为 scheme://地址/servicer_name, 地址可以是逗号分隔的多个 host:port
+    grpc://127.0.0.1:5000/servicer_name
+    static://host-a:5000,[::1]:5001/servicer_name
+    dns://my-service.local:5000/servicer_name
+    file:///etc/servicer.json   (json: [{"host": .., "port": .., "weight": ..}])
+    memory://name/servicer_name  (进程内 set_memory_servers 设置 测试/benchmark用)
+    zookeeper://127.0.0.1:2181/servicer_name
+
+resolver 都提供 get_servers/add_listener/close, 服务列表变化时通知listener,
+由负载均衡策略和连接池使用
+"""
+import json
+import os
+import re
+import socket
+import threading
+from collections import defaultdict
+
+from grpc_frog.core.context import log
+
+_uri_pattern = re.compile(r"^([a-zA-Z][\w+.-]*)://([^/]*)/?(.*)$")
+
+
+def parse_uri(uri: str) -> (str, str, str):
+    """uri -> (scheme, 地址, 剩余路径)"""
+    match_obj = _uri_pattern.match(uri or "")
+    if match_obj is None:
+        raise ValueError(
+            "{}错误 e.g zookeeper://127.0.0.1:5000/servicer_name".format(uri)
+        )
+    return match_obj.groups()
+
+
+def get_servicer_name(uri: str) -> str:
+    """uri中的servicer名称 file:// 的路径是文件地址 不包含servicer名称"""
+    scheme, _, path = parse_uri(uri)
+    if scheme == "file":
+        return ""
+    return path.split("/")[0]
+
+
+def parse_hosts(authority: str) -> list:
+    """
+    host:port,host:port -> [{"host": str, "port": int}]
+    ipv6地址需要写在[]中 e.g. [::1]:5000
+    """
+    servers = []
+    for item in authority.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        match_obj = re.match(r"^(?:\[([0-9a-fA-F:.%]+)\]|([^:\[\]]+)):(\d+)$", item)
+        if match_obj is None:
+            raise ValueError("地址错误 {} e.g. 127.0.0.1:5000 [::1]:5000".format(item))
+        ipv6, host, port = match_obj.groups()
+        servers.append({"host": ipv6 or host, "port": int(port)})
+    if not servers:
+        raise ValueError("{} 中没有服务地址".format(authority))
+    return servers
+
+
+class Resolver:
+    """服务发现基类 服务列表固定"""
+
+    def __init__(self, servers=()):
+        self._servers = tuple(servers)  # 服务信息的快照
+        self._listeners = []  # 服务列表变化时的回调 func(servers)
+        self._publish_lock = threading.Lock()
+
+    def get_servers(self) -> tuple:
+        """当前全部可用服务的信息 不可变的快照"""
+        return self._servers
+
+    def add_listener(self, listener):
+        """注册服务列表变化的回调 参数为当前全部服务信息"""
+        self._listeners.append(listener)
+
+    def _publish(self, servers):
+        """发布新的服务列表 有变化时通知listener"""
+        servers = tuple(servers)
+        with self._publish_lock:
+            if servers == self._servers:
+                return
+            self._servers = servers
+        for listener in list(self._listeners):
+            listener(servers)
+
+    def close(self):
+        """停止服务发现"""
+        self._listeners.clear()
+
+
+class StaticResolver(Resolver):
+    """static://h1:1,h2:2/servicer_name 固定的服务列表"""
+
+    def __init__(self, authority, path):
+        super().__init__(parse_hosts(authority))
+
+
+class PollingResolver(Resolver):
+    """在后台线程中定时重新获取服务列表"""
+
+    interval = 30  # 秒
+
+    def __init__(self):
+        super().__init__(self._load())
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="grpc_frog-resolver", daemon=True
+        )
+        self._thread.start()
+
+    def _load(self) -> list:
+        raise NotImplementedError
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self._publish(self._load())
+            except Exception as err:
+                # 获取失败时保留之前的服务列表
+                log.warning("{} 更新服务列表失败: {}".format(type(self).__name__, err))
+
+    def close(self):
+        self._stopped.set()
+        super().close()
+
+
+class DnsResolver(PollingResolver):
+    """dns://host:port/servicer_name 解析出的全部地址 每30秒重新解析"""
+
+    def __init__(self, authority, path):
+        self._hosts = parse_hosts(authority)
+        super().__init__()
+
+    def _load(self):
+        servers = []
+        for item in self._hosts:
+            infos = socket.getaddrinfo(
+                item["host"], item["port"], type=socket.SOCK_STREAM
+            )
+            for address in sorted({i[4][0] for i in infos}):
+                servers.append({"host": address, "port": item["port"]})
+        return servers
+
+
+class FileResolver(PollingResolver):
+    """
+    file:///path/servers.json 从json文件读取服务列表
+    每秒检查文件的修改时间 变化时重新读取
+    """
+
+    interval = 1
+
+    def __init__(self, authority, path):
+        self._path = "/" + path if not authority else os.path.join(authority, path)
+        self._mtime = None
+        self._file_servers = []
+        super().__init__()
+
+    def _load(self):
+        stat = os.stat(self._path)
+        # 修改时间的精度可能不够 同时比较文件大小
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        if mtime != self._mtime:
+            with open(self._path, encoding="utf8") as f:
+                data = json.load(f)
+            # 兼容 {"servers": [...]} 格式
+            if isinstance(data, dict):
+                data = data.get("servers", [])
+            self._file_servers = [i for i in data if i.get("host") and i.get("port")]
+            self._mtime = mtime
+        return self._file_servers
+
+
+# memory:// 的服务列表 name : servers
+_memory_servers = {}
+_memory_resolvers = defaultdict(list)  # name : [MemoryResolver]
+_memory_lock = threading.Lock()
+
+
+def set_memory_servers(name: str, servers):
+    """
+    设置 memory://name 的服务列表 并通知已创建的resolver
+    :param servers: [{"host": str, "port": int}] 或 "host:port,host:port"
+    """
+    if isinstance(servers, str):
+        servers = parse_hosts(servers)
+    with _memory_lock:
+        _memory_servers[name] = list(servers)
+        resolvers = list(_memory_resolvers[name])
+    for resolver in resolvers:
+        resolver._publish(servers)
+
+
+class MemoryResolver(Resolver):
+    """memory://name/servicer_name 进程内的服务列表 通过 set_memory_servers 修改"""
+
+    def __init__(self, authority, path):
+        self._name = authority
+        with _memory_lock:
+            super().__init__(_memory_servers.get(authority, ()))
+            _memory_resolvers[authority].append(self)
+
+    def close(self):
+        with _memory_lock:
+            if self in _memory_resolvers[self._name]:
+                _memory_resolvers[self._name].remove(self)
+        super().close()
+
+
+def _zookeeper_resolver(authority, path):
+    """zookeeper://host:port/servicer_name"""
+    # kazoo 只在使用zookeeper时导入
+    from grpc_frog.zk_utils import DistributedChannel
+
+    parse_hosts(authority)
+    # 集群的多个地址一起交给kazoo
+    return DistributedChannel(authority, None, path.split("/")[0])
+
+
+# scheme : func(地址, 路径) -> resolver
+resolvers = {
+    "grpc": StaticResolver,
+    "static": StaticResolver,
+    "dns": DnsResolver,
+    "file": FileResolver,
+    "memory": MemoryResolver,
+    "zookeeper": _zookeeper_resolver,
+}
+
+
+def register_resolver(scheme: str, factory):
+    """
+    注册服务发现方式
+    :param factory: func(地址, 路径) 返回提供 get_servers/add_listener/close 的对象
+    """
+    resolvers[scheme] = factory
+
+
+def create_resolver(uri: str):
+    """由uri创建resolver"""
+    scheme, authority, path = parse_uri(uri)
+    if scheme not in resolvers:
+        raise ValueError("driver 错误 请选择 [{}]".format("|".join(resolvers)))
+    return resolvers[scheme](authority, path)
@@ -2,19 +2,25 @@
 # encoding: utf-8
 # Created by zza on 2021/1/20 10:28
 # Copyright 2021 LinkSense Technology CO,. Ltd
+import asyncio
 import functools
 import importlib
 import inspect
 import os
-import re
 import sys
+import threading
+import time
 
 import grpc
 
 import grpc_frog.proto as proto
-from grpc_frog.core.context import context
+from grpc_frog.core import proto_type_recorder
+from grpc_frog.core.balancer import create_balancer
+from grpc_frog.core.channel import ChannelPool
+from grpc_frog.core.context import context, log
+from grpc_frog.core.load import LoadStats
 from grpc_frog.core.method import Method
-from grpc_frog.zk_utils import DistributedChannel
+from grpc_frog.core.resolver import create_resolver
 
 
 class Servicer:
@@ -30,30 +36,47 @@ class Servicer:
     生成的路由则为 aaa/bbb
     """
 
-    def __init__(self, name, proto_dir=None):
+    def __init__(self, name, proto_dir=None, in_memory=False):
         """
         初始化
 
         :param name: servicer 名称 也是 client_init 连接后缀
         :param proto_dir: proto文件存放地址
+        :param in_memory: 不读取pb2文件 由注册的model在内存中生成pb2/pb2_grpc
         """
         self.name = name
-        self.bind_method_map = {}  # str:function
+        self.in_memory = in_memory
+        self._bind_method_map = {}  # str:Method
+        self._pending_methods = {}  # str:(func, response_model, request_model) 尚未解析
+        self._method_lock = threading.RLock()
         self.request_extra_field_map = {}  # str:py_type
         self.response_extra_field_map = {}  # str:py_type
         self.handle_extra_field_callable_func = {}  # str:callable_func
         self._pb2_grpc = None
+        self.load_stats = LoadStats()  # 作为server端时 unary请求的负载统计
 
-        self._channel = None  # 作为client端时 获取连接地址的数据
-        self._driver = None  # 判断_channel类型用
+        self._resolver = None  # 作为client端时 提供服务地址的resolver
+        self._balancer = None  # 作为client端时 选择连接地址的负载均衡策略
+        self._channel_pool = None  # 作为client端时 复用的channel连接池
+        self._aio_channel_pools = {}  # loop : aio连接池 aclose/close时释放
+        self._pool_lock = threading.Lock()
 
         if proto_dir is None:
             proto_dir = os.path.dirname(proto.__file__)
         self.proto_dir = proto_dir
 
+    @functools.lru_cache()
+    def _get_in_memory_modules(self):
+        """在内存中生成 (pb2, pb2_grpc) 不需要protoc和proto文件"""
+        from grpc_frog.core.descriptor import build_pb2_modules
+
+        return build_pb2_modules(self)
+
     @functools.lru_cache()
     def get_pb2(self):
         """ 获取当前servicer的pb2对象 """
+        if self.in_memory:
+            return self._get_in_memory_modules()[0]
         file_path = os.path.join(self.proto_dir, "{}_pb2.py".format(self.name))
         spec = importlib.util.spec_from_file_location(self.name, file_path)
         pb2 = importlib.util.module_from_spec(spec)
@@ -63,6 +86,8 @@ class Servicer:
     @functools.lru_cache()
     def get_pb2_grpc(self, proto_dir: str = None):
         """ 获取当前servicer的pb2_grpc对象 """
+        if self.in_memory:
+            return self._get_in_memory_modules()[1]
         proto_dir = proto_dir or self.proto_dir
         sys.path.append(self.proto_dir)
         file_path = os.path.join(self.proto_dir, "{}_pb2_grpc.py".format(self.name))
@@ -73,10 +98,31 @@ class Servicer:
         return pb2_grpc
 
     def register_method(self, func, response_model=None, request_model=None):
-        """ 给当前服务注册一个方法 """
-        _m = Method(func, self, response_model, request_model)
-        self.bind_method_map[_m.name] = _m
-        return _m
+        """
+        给当前服务注册一个方法
+        只记录函数 解析注解、注册类型在 resolve_methods 中进行
+        """
+        with self._method_lock:
+            self._pending_methods[func.__name__] = (func, response_model, request_model)
+
+    def resolve_methods(self):
+        """
+        将注册的函数解析成Method 每个函数只解析一次
+        在 bind_servicer、client_init、生成proto或第一次调用时触发
+        """
+        with self._method_lock:
+            while self._pending_methods:
+                name, (func, *models) = next(iter(self._pending_methods.items()))
+                # 解析失败时保留 下次访问时再次抛出
+                self._bind_method_map[name] = Method(func, self, *models)
+                del self._pending_methods[name]
+
+    @property
+    def bind_method_map(self) -> dict:
+        """ 已注册的method str:Method """
+        if self._pending_methods:
+            self.resolve_methods()
+        return self._bind_method_map
 
     def add_request_extra_field(self, field_name: str, field_py_type: type):
         """ 增加method请求体体默认参数 """
@@ -90,34 +136,124 @@ class Servicer:
         """
         注册一个method
         server用
+
+        * def / async def 的函数
+        * 返回值注解为 Iterator[Model] 的生成器(async generator) 会生成 stream 接口
+        * 唯一参数注解为 Iterator[Model] 时为 stream 请求 参数为惰性转换的model迭代器
         """
 
         # 第一层 获取参数
         def _record_method(func):
             # 第二层 修改func
-            @functools.wraps(func)
-            def wrapper(request, _context):
-                # 第三层 处理Input Output
-                _m = self.bind_method_map[func.__name__]
-                # 将当前请求相关参数放入全局context
-                context.fill(
-                    _m, request, _m.request_model, _m.response_ret_2_message, _context
-                )
-                # 将CMessage转成dict
-                kw_args = _m.request_message_2_dict(request)
-                # 去除外加的参数
-                self._handle_extra_fields(kw_args)
-                # 调用函数逻辑
-                func_ret = func(**kw_args)
-                # 将函数返回值(model)转换成CMessage
-                ret = _m.response_ret_2_message(func_ret)
-                return ret
+            response_stream = _is_response_stream(func, args, kwargs)
+            if inspect.isasyncgenfunction(func):
+                wrapper = self._make_async_stream_handler(func)
+            elif inspect.iscoroutinefunction(func):
+                if response_stream:
+                    raise TypeError(
+                        "{} 流式返回请使用 async generator(yield)".format(func.__name__)
+                    )
+                wrapper = self._make_async_handler(func)
+            elif response_stream:
+                wrapper = self._make_stream_handler(func)
+            else:
+                wrapper = self._make_handler(func)
 
             self.register_method(wrapper, *args, **kwargs)
             return func
 
         return _record_method
 
+    def _make_handler(self, func):
+        @functools.wraps(func)
+        def wrapper(request, _context):
+            # 第三层 处理Input Output
+            _m = self.bind_method_map[func.__name__]
+            # 将当前请求相关参数放入context 请求结束后释放
+            token = context.fill(
+                _m, request, _m.request_model, _m.response_ret_2_message, _context
+            )
+            start = self.load_stats.on_start()
+            try:
+                kw_args = self._parse_request(_m, request)
+                # 调用函数逻辑
+                func_ret = func(**kw_args)
+                # 将函数返回值(model)转换成CMessage
+                ret = _m.response_ret_2_message(func_ret)
+                return ret
+            finally:
+                self.load_stats.on_done(start)
+                context.reset(token)
+
+        return wrapper
+
+    def _make_stream_handler(self, func):
+        """ 返回 stream 的handler 每产生一个model就转换并发送一个CMessage """
+
+        @functools.wraps(func)
+        def wrapper(request, _context):
+            _m = self.bind_method_map[func.__name__]
+            token = context.fill(
+                _m, request, _m.request_model, _m.response_ret_2_message, _context
+            )
+            try:
+                kw_args = self._parse_request(_m, request)
+                for func_ret in func(**kw_args):
+                    yield _m.response_ret_2_message(func_ret)
+            finally:
+                context.reset(token)
+
+        return wrapper
+
+    def _make_async_handler(self, func):
+        """ async def 的handler 用于 grpc.aio.server """
+
+        @functools.wraps(func)
+        async def wrapper(request, _context):
+            _m = self.bind_method_map[func.__name__]
+            token = context.fill(
+                _m, request, _m.request_model, _m.response_ret_2_message, _context
+            )
+            start = self.load_stats.on_start()
+            try:
+                kw_args = self._parse_request(_m, request)
+                func_ret = await func(**kw_args)
+                return _m.response_ret_2_message(func_ret)
+            finally:
+                self.load_stats.on_done(start)
+                context.reset(token)
+
+        return wrapper
+
+    def _make_async_stream_handler(self, func):
+        """ async generator 的handler 用于 grpc.aio.server """
+
+        @functools.wraps(func)
+        async def wrapper(request, _context):
+            _m = self.bind_method_map[func.__name__]
+            token = context.fill(
+                _m, request, _m.request_model, _m.response_ret_2_message, _context
+            )
+            try:
+                kw_args = self._parse_request(_m, request)
+                async for func_ret in func(**kw_args):
+                    yield _m.response_ret_2_message(func_ret)
+            finally:
+                context.reset(token)
+
+        return wrapper
+
+    def _parse_request(self, _m, request) -> dict:
+        """ server端 将请求CMessage转换成函数参数 """
+        if _m.request_streaming:
+            # stream 请求 收到一个CMessage转换一个model
+            return {_m.request_stream_arg: _m.request_messages_2_models(request)}
+        # 将CMessage转成dict
+        kw_args = _m.request_message_2_dict(request)
+        # 去除外加的参数
+        self._handle_extra_fields(kw_args)
+        return kw_args
+
     def _handle_extra_fields(self, kw_args: dict):
         """ 过滤掉额外的字段 触发hook函数 """
         for field_name in self.request_extra_field_map.keys():
@@ -132,81 +268,342 @@ class Servicer:
         """
         记录可以远程调用的method
         client用
+
+        * async def 声明的函数 使用grpc.aio channel 返回coroutine
+        * 返回值注解为 Iterator[Model] 时返回惰性的迭代器(async def 时为async iterator)
+        * 唯一参数注解为 Iterator[Model] 时为 stream 请求 可以传入iterable或async iterable
         """
 
         # 第一层 获取参数
         def _record_method(func):
             # 第二层 修改func
-            @functools.wraps(func)
-            def wrapper(*args, **kwargs):
-                # 第三层 处理Input Output
-                _m = self.bind_method_map[func.__name__]
-                # 将函数参数转换成CMessage
-                sig = inspect.signature(func)
-                bound_values = sig.bind(*args, **kwargs)
-                message = _m.request_ret_2_message(dict(**bound_values.arguments))
-                # 远程调用函数
-
-                with grpc.insecure_channel(
-                    self.channel_url, options=self.get_channel_options()
-                ) as channel:
-                    self._stub = getattr(
-                        self.get_pb2_grpc(), "{}Stub".format(self.name)
-                    )(channel)
-                    context.fill(
-                        _m,
-                        message,
-                        _m.request_model,
-                        _m.response_ret_2_message,
-                        self._stub,
-                    )
-                    remote_result = getattr(self._stub, func.__name__)(message)
-                # 将CMessage转换成dict 并装填到response_model中
-                res_obj = _m.response_model(**_m.response_message_2_dict(remote_result))
-                return res_obj
+            response_stream = _is_response_stream(func, args, kwargs)
+            is_async = inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(
+                func
+            )
+            if is_async and response_stream:
+                wrapper = self._make_async_stream_call(func)
+            elif is_async:
+                wrapper = self._make_async_call(func)
+            elif response_stream:
+                wrapper = self._make_stream_call(func)
+            else:
+                wrapper = self._make_call(func)
 
             self.register_method(wrapper, *args, **kwargs)
             return wrapper
 
         return _record_method
 
+    def _make_call(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 第三层 处理Input Output
+            _m = self.bind_method_map[func.__name__]
+            # 将函数参数转换成CMessage
+            message = self._build_request(_m, args, kwargs)
+            # 远程调用函数
+            target, stub = self._pick_stub()
+            token = context.fill(
+                _m, message, _m.request_model, _m.response_ret_2_message, stub
+            )
+            balancer = self._balancer
+            start = balancer.on_start(target)
+            try:
+                remote_result = getattr(stub, func.__name__)(message)
+            finally:
+                balancer.on_done(target, start)
+                context.reset(token)
+            # 将CMessage转换成dict 并装填到response_model中
+            res_obj = _m.response_model(**_m.response_message_2_dict(remote_result))
+            return res_obj
+
+        return wrapper
+
+    def _make_stream_call(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _m = self.bind_method_map[func.__name__]
+            message = self._build_request(_m, args, kwargs)
+            stub = self.get_stub()
+            token = context.fill(
+                _m, message, _m.request_model, _m.response_ret_2_message, stub
+            )
+            try:
+                responses = getattr(stub, func.__name__)(message)
+            finally:
+                context.reset(token)
+            # 收到一个CMessage转换一个model
+            return (
+                _m.response_model(**_m.response_message_2_dict(response))
+                for response in responses
+            )
+
+        return wrapper
+
+    def _make_async_call(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            _m = self.bind_method_map[func.__name__]
+            message = self._build_request(_m, args, kwargs)
+            target, stub = self._pick_aio_stub()
+            token = context.fill(
+                _m, message, _m.request_model, _m.response_ret_2_message, stub
+            )
+            balancer = self._balancer
+            start = balancer.on_start(target)
+            try:
+                remote_result = await getattr(stub, func.__name__)(message)
+            finally:
+                balancer.on_done(target, start)
+                context.reset(token)
+            return _m.response_model(**_m.response_message_2_dict(remote_result))
+
+        return wrapper
+
+    def _make_async_stream_call(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            _m = self.bind_method_map[func.__name__]
+            message = self._build_request(_m, args, kwargs)
+            stub = self.get_aio_stub()
+            token = context.fill(
+                _m, message, _m.request_model, _m.response_ret_2_message, stub
+            )
+            try:
+                responses = getattr(stub, func.__name__)(message)
+            finally:
+                context.reset(token)
+            async for response in responses:
+                yield _m.response_model(**_m.response_message_2_dict(response))
+
+        return wrapper
+
+    @staticmethod
+    def _build_request(_m, args, kwargs):
+        """client端 将函数参数转换成CMessage stream 请求时为CMessage的迭代器"""
+        arguments = _m.bind_arguments(args, kwargs)
+        if _m.request_streaming:
+            return _m.request_models_2_messages(arguments[_m.request_stream_arg])
+        return _m.request_ret_2_message(arguments)
+
     def get_pb2_message(self, message_name):
         """获取CMessages对象"""
         return getattr(self.get_pb2(), message_name)
 
     @property
     def channel_url(self):
-        """获取 channel"""
-        if self._driver is None:
+        """由负载均衡策略选择本次调用的连接地址"""
+        if self._resolver is None:
             from grpc_frog import frog
 
             self.client_init(frog.get_servicer_uri(self.name))
-
-        if self._driver == "grpc":
-            return self._channel
-        elif self._driver == "zookeeper":
-            server = self._channel.get_server()
-            _uri = "{}:{}".format(server.get("host"), server.get("port"))
-            return _uri
-        else:
-            raise ValueError("No dirver match to {}".format(self._driver))
-
-    def client_init(self, uri, proto_dir=None):
-        """ servicer作为客户端初始化"""
-        match_obj = re.match(r"(\w*)://([\w.]*):(\d*)/?(\w*)", uri)
-        self._driver, ip, port, servicer_name = match_obj.groups()
-        if self._driver == "grpc":
-            self._channel = "{}:{}".format(ip, port)
-        elif self._driver == "zookeeper":
-            self._channel = DistributedChannel(ip, port, servicer_name)
-        else:
-            raise ValueError("driver 错误 请选择 [grpc|zookeeper]")
+        return self._balancer.pick()
+
+    def get_stub(self):
+        """从连接池获取当前连接地址对应的stub"""
+        return self._pick_stub()[1]
+
+    def _pick_stub(self):
+        """选择连接地址 返回 (target, stub)"""
+        target = self.channel_url
+        return target, self._get_channel_pool().get_stub(target)
+
+    def _get_channel_pool(self) -> ChannelPool:
+        """获取连接池 close之后再次使用时重新创建"""
+        # 局部变量持有连接池 close在其他线程中替换连接池不影响本次调用
+        pool = self._channel_pool
+        if pool is None:
+            with self._pool_lock:
+                if self._channel_pool is None:
+                    self._channel_pool = ChannelPool(
+                        self._make_stub, self.get_channel_options()
+                    )
+                pool = self._channel_pool
+        return pool
+
+    def get_aio_stub(self):
+        """从当前事件循环的aio连接池获取stub"""
+        return self._pick_aio_stub()[1]
+
+    def _pick_aio_stub(self):
+        """选择连接地址 返回 (target, aio stub)"""
+        target = self.channel_url
+        loop = asyncio.get_running_loop()
+        pool = self._aio_channel_pools.get(loop)
+        if pool is None:
+            with self._pool_lock:
+                pool = self._aio_channel_pools.get(loop)
+                if pool is None:
+                    pool = ChannelPool(
+                        self._make_stub, self.get_channel_options(), aio=True
+                    )
+                    self._aio_channel_pools[loop] = pool
+        return target, pool.get_stub(target)
+
+    def _on_servers_changed(self, servers):
+        """服务列表变化 更新负载均衡策略 关闭已下线服务的channel"""
+        self._balancer.update(servers)
+        targets = self._balancer.targets()
+        pool = self._channel_pool
+        if pool is not None:
+            pool.retain(targets)
+        for loop, aio_pool in list(self._aio_channel_pools.items()):
+            _close_aio_channels(loop, aio_pool.evict(targets))
+
+    def _make_stub(self, channel):
+        """通过pb2_grpc生成stub"""
+        return getattr(self.get_pb2_grpc(), "{}Stub".format(self.name))(channel)
+
+    def client_init(
+        self,
+        uri,
+        proto_dir=None,
+        connect_timeout: float = None,
+        lb_policy="random",
+    ):
+        """
+        servicer作为客户端初始化
+        :param uri: e.g. grpc://127.0.0.1:5000 static://h1:5000,[::1]:5001/name
+            dns:// file:// memory:// zookeeper:// 见 grpc_frog.core.resolver
+        :param connect_timeout: 预热时等待连接就绪的秒数 默认不等待
+        :param lb_policy: 多个服务地址时的负载均衡策略
+            random|round_robin|least_outstanding|p2c_ewma|weighted 或 Balancer子类
+            grpc_round_robin: 全部地址共用一个channel 由grpc按请求轮询
+        """
+        self.resolve_methods()
+        balancer = create_balancer(lb_policy)
+        resolver = create_resolver(uri)
+        resolver.add_listener(self._on_servers_changed)
+        balancer.update(resolver.get_servers())
+        self._balancer = balancer
+        # 重新初始化时停止旧的服务发现
+        old_resolver, self._resolver = self._resolver, resolver
+        if old_resolver is not None:
+            old_resolver.close()
 
         if proto_dir is not None:
             self.proto_dir = proto_dir
 
+        # 重新初始化时释放旧连接
+        self.close()
+        try:
+            self.warmup(connect_timeout)
+        except FileNotFoundError as err:
+            # client可以先初始化 再生成pb2文件
+            log.warning("{} 预热失败 第一次调用时再加载: {}".format(self.name, err))
+
+    def warmup(self, connect_timeout: float = None) -> dict:
+        """
+        预热 避免第一次请求时才解析method、导入pb2、编译codec、建立连接
+        bind_servicer 和 client_init 时自动调用
+        :param connect_timeout: 作为client端时 等待channel连接就绪的秒数 None时不等待
+        :return: 每一步的耗时(秒) {step: seconds}
+        """
+        steps = [
+            ("methods", self.resolve_methods),
+            ("modules", self._warmup_modules),
+            ("codecs", self._warmup_codecs),
+        ]
+        if self._resolver is not None:
+            steps.append(
+                ("channels", functools.partial(self._warmup_channels, connect_timeout))
+            )
+        timings = {}
+        for step, func in steps:
+            start = time.perf_counter()
+            func()
+            timings[step] = time.perf_counter() - start
+        log.info(
+            "{} warmup {}".format(
+                self.name,
+                ", ".join(
+                    "{}: {:.1f}ms".format(k, v * 1000) for k, v in timings.items()
+                ),
+            )
+        )
+        return timings
+
+    def _warmup_modules(self):
+        self.get_pb2()
+        self.get_pb2_grpc()
+
+    def _warmup_codecs(self):
+        for _m in self.bind_method_map.values():
+            _m.warmup()
+
+    def _warmup_channels(self, connect_timeout):
+        """建立channel和stub connect_timeout不为None时等待连接就绪"""
+        targets = self._balancer.targets()
+        pool = self._get_channel_pool()
+        for target in targets:
+            pool.get_stub(target)
+            if connect_timeout is None:
+                continue
+            ready_future = grpc.channel_ready_future(pool.get_channel(target))
+            try:
+                ready_future.result(timeout=connect_timeout)
+            except grpc.FutureTimeoutError:
+                log.warning("{} 连接 {} 超时".format(self.name, target))
+            finally:
+                # 停止监听连接状态
+                ready_future.cancel()
+
+    def close(self):
+        """关闭client端的所有channel
+        aio channel 交给所属事件循环关闭, 事件循环已关闭时只释放引用
+        """
+        with self._pool_lock:
+            pool, self._channel_pool = self._channel_pool, None
+            aio_pools, self._aio_channel_pools = self._aio_channel_pools, {}
+        if pool is not None:
+            pool.close()
+        for loop, aio_pool in aio_pools.items():
+            _close_aio_channels(loop, aio_pool._pop_channels())
+
+    async def aclose(self):
+        """关闭当前事件循环中的aio channel"""
+        with self._pool_lock:
+            pool = self._aio_channel_pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
     @functools.lru_cache()
     def get_channel_options(self):
         from grpc_frog import frog
 
-        return frog.get_channel_options()
+        options = frog.get_channel_options()
+        if self._balancer is not None:
+            options = options + self._balancer.channel_options
+        return options
+
+
+def _close_aio_channels(loop, channels):
+    """在aio channel所属的事件循环中关闭channel"""
+    if not channels or loop.is_closed():
+        return
+
+    async def _aclose():
+        for channel in channels:
+            await channel.close()
+
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        loop.create_task(_aclose())
+    elif loop.is_running():
+        asyncio.run_coroutine_threadsafe(_aclose(), loop)
+    else:
+        loop.run_until_complete(_aclose())
+
+
+def _is_response_stream(func, args, kwargs) -> bool:
+    """ 通过 response_model 参数或返回值注解判断是否为 stream 返回 """
+    response_model = kwargs.get("response_model", args[0] if args else None)
+    return_annotation = func.__annotations__.get("return")
+    return any(
+        proto_type_recorder.get_stream_type(i) is not None
+        for i in (response_model, return_annotation)
+    )
@@ -2,3 +2,22 @@
 # encoding: utf-8
 # Created by zza on 2021/2/19 17:22
 # Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+代码生成 依赖grpcio-tools(protoc)
+
+生成器只在调用时导入, in_memory=True 的servicer运行时不需要安装grpcio-tools
+"""
+
+
+def generate_proto_file(*args, **kwargs):
+    """生成proto文件 参数见 grpc_frog.generator.python_to_proto.generate_proto_file"""
+    from grpc_frog.generator.python_to_proto import generate_proto_file
+
+    return generate_proto_file(*args, **kwargs)
+
+
+def generate_py_code(*args, **kwargs):
+    """生成python文件 参数见 grpc_frog.generator.proto_to_python.generate_py_code"""
+    from grpc_frog.generator.proto_to_python import generate_py_code
+
+    return generate_py_code(*args, **kwargs)
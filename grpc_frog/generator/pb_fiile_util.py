@@ -4,35 +4,193 @@
 # @author  : zza
 # @Email   : 740713651@qq.com
 # @File    : pb_fiile_util.py
+import hashlib
+import multiprocessing
 import os
-from distutils.dir_util import copy_tree, remove_tree
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
+import google.protobuf
 from grpc_tools import protoc
 
 from grpc_frog.proto import google_dir
 
+# 共享的pb2缓存目录 多个worker可以复用同一份编译结果
+proto_cache_dir_env = "grpc_frog__proto_cache_dir"
 
-def generate_pb2_file(proto_file: str) -> None:
-    """生成pb2文件"""
-    # copy google dir
-    proto_dir = os.path.dirname(proto_file)
+
+def generate_pb2_file(proto_file: str, descriptor_set_out: str = None) -> None:
+    """
+    生成pb2文件
+    :param descriptor_set_out: 同时输出带注释信息的FileDescriptorSet到这个文件
+    """
+    if descriptor_set_out is None:
+        generate_pb2_files([proto_file])
+        return
+    extra_args = ("--include_source_info", "--descriptor_set_out=" + descriptor_set_out)
+    _run_protoc(os.path.dirname(proto_file), [proto_file], extra_args)
+
+
+def generate_pb2_files(proto_files: list, workers: int = None) -> None:
+    """
+    生成多个proto文件的pb2文件
+    * 默认同一目录下的proto文件只调用一次protoc
+    * workers > 1 时每个proto文件在进程池中单独编译 全部完成后汇总报错
+    """
+    if workers and workers > 1 and len(proto_files) > 1:
+        _generate_pb2_files_parallel(proto_files, workers)
+        return
+    proto_dir_map = {}  # proto_dir : [proto_file]
+    for proto_file in proto_files:
+        proto_dir_map.setdefault(os.path.dirname(proto_file), []).append(proto_file)
+    for proto_dir, files in proto_dir_map.items():
+        _run_protoc(proto_dir, files)
+
+
+def _generate_pb2_files_parallel(proto_files: list, workers: int) -> None:
+    # grpc不支持fork 子进程使用spawn启动
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+        # 按输入顺序收集结果 报错信息的顺序是确定的
+        results = list(executor.map(_compile_proto_file, proto_files))
+    errors = [
+        "{}: {}".format(proto_file, error)
+        for proto_file, error in zip(proto_files, results)
+        if error
+    ]
+    if errors:
+        raise SyntaxError("编译proto文件失败:\n" + "\n".join(errors))
+
+
+def _compile_proto_file(proto_file: str):
+    """进程池中编译单个proto文件 返回错误信息"""
+    try:
+        _run_protoc(os.path.dirname(proto_file), [proto_file])
+    except Exception as err:
+        return str(err)
+    return None
+
+
+def _run_protoc(proto_dir: str, proto_files: list, extra_args=()) -> None:
+    # 内置的google/protobuf/*.proto 作为额外的include路径 不复制到proto_dir
     args = (
         "grpc_tools.protoc",
         "-I" + proto_dir,
+        "-I" + google_dir,
         "--python_out=" + proto_dir,
         "--grpc_python_out=" + proto_dir,
-        proto_file,
+        *extra_args,
+        *proto_files,
     )
-    copy_tree(os.path.join(google_dir, "google"), os.path.join(proto_dir, "google"))
     protoc_result = protoc.main(args)
-    remove_tree(os.path.join(proto_dir, "google"))
     if protoc_result == 1:
         message = "编译{}下的文件时产生了一个错误args:\n" "python -m grpc.tools.protoc " + " ".join(
             args
         )
         raise SyntaxError(message)
 
+    _make_init_file(proto_dir)
+
+
+def _make_init_file(proto_dir: str) -> None:
     init_file = os.path.join(os.path.dirname(proto_dir), "__init__.py")
     if not os.path.exists(init_file):
-        with open(init_file, "w") as fp:
+        with open(init_file, "w"):
             pass
+
+
+def _get_protoc_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("grpcio-tools")
+    except Exception:  # pragma: no cover
+        return "unknown"
+
+
+def get_proto_digest(proto_body: str) -> str:
+    """proto内容 + frog/protobuf/protoc版本 的hash 相同则编译结果相同"""
+    from grpc_frog import __version__
+
+    text = "\n".join(
+        [proto_body, __version__, google.protobuf.__version__, _get_protoc_version()]
+    )
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+
+def _artifact_names(proto_file: str):
+    """proto文件对应的 (proto, pb2, pb2_grpc) 文件名"""
+    name = os.path.basename(proto_file)[: -len(".proto")]
+    return [name + ".proto", name + "_pb2.py", name + "_pb2_grpc.py"]
+
+
+def _digest_file(proto_file: str) -> str:
+    return proto_file + ".hash"
+
+
+def _get_cache_dir(cache_dir: str = None):
+    return cache_dir or os.environ.get(proto_cache_dir_env)
+
+
+def restore_pb2_file(proto_file: str, digest: str, cache_dir: str = None) -> bool:
+    """
+    proto内容未变化时复用已有的pb2文件
+    1. proto_dir中已有相同hash的编译结果 直接跳过
+    2. 共享缓存目录中有相同hash的编译结果 复制到proto_dir
+    :return: 是否命中缓存
+    """
+    proto_dir = os.path.dirname(proto_file)
+    names = _artifact_names(proto_file)
+    digest_file = _digest_file(proto_file)
+    if os.path.exists(digest_file) and all(
+        os.path.exists(os.path.join(proto_dir, i)) for i in names
+    ):
+        with open(digest_file, "r", encoding="utf8") as f:
+            if f.read().strip() == digest:
+                return True
+
+    cache_dir = _get_cache_dir(cache_dir)
+    if not cache_dir:
+        return False
+    cached_dir = os.path.join(cache_dir, digest)
+    if not all(os.path.exists(os.path.join(cached_dir, i)) for i in names):
+        return False
+    for name in names:
+        _atomic_copy(os.path.join(cached_dir, name), os.path.join(proto_dir, name))
+    _write_digest(proto_file, digest)
+    _make_init_file(proto_dir)
+    return True
+
+
+def save_pb2_file(proto_file: str, digest: str, cache_dir: str = None) -> None:
+    """记录编译结果的hash 并放入共享缓存目录"""
+    _write_digest(proto_file, digest)
+    cache_dir = _get_cache_dir(cache_dir)
+    if not cache_dir:
+        return
+    cached_dir = os.path.join(cache_dir, digest)
+    if os.path.exists(cached_dir):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写到临时目录再rename 其他进程不会看到写了一半的缓存
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_")
+    proto_dir = os.path.dirname(proto_file)
+    for name in _artifact_names(proto_file):
+        shutil.copyfile(os.path.join(proto_dir, name), os.path.join(tmp_dir, name))
+    try:
+        os.rename(tmp_dir, cached_dir)
+    except OSError:
+        # 其他进程已经写入了同样的缓存
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_digest(proto_file: str, digest: str) -> None:
+    with open(_digest_file(proto_file), "w", encoding="utf8") as f:
+        f.write(digest)
+
+
+def _atomic_copy(src: str, dst: str) -> None:
+    tmp_file = "{}.{}.tmp".format(dst, os.getpid())
+    shutil.copyfile(src, tmp_file)
+    os.replace(tmp_file, dst)
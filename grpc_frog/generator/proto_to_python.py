@@ -3,11 +3,18 @@
 # Created by zza on 2021/2/19 17:22
 # Copyright 2021 LinkSense Technology CO,. Ltd
 """将proto转换成python model"""
+
+import hashlib
+import multiprocessing
 import os
-import re
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from shutil import copyfile
 from typing import Dict, Iterator, List, Tuple
 
+from google.protobuf import descriptor_pb2
+
 import grpc_frog.template.model as model
 from grpc_frog.core import log, proto_type_recorder
 from grpc_frog.core.proto_type_recorder import proto_base_type
@@ -15,7 +22,7 @@ from grpc_frog.generator.pb_fiile_util import generate_pb2_file
 
 _servicer_text = """
 import os
-from typing import List, Dict
+from typing import List, Dict, Iterator
 from .model_{proto_name} import {models}
 from grpc_frog import Servicer, frog
 
@@ -38,6 +45,40 @@ def init_server() -> None:  # pragma: no cover
 """
 
 
+# 生成的文件首行 记录未格式化代码的hash
+_digest_prefix = "# grpc_frog generated, source hash: "
+# 需要格式化的文件数达到这个数量时 使用进程池并行格式化
+_parallel_threshold = 4
+
+# FieldDescriptorProto.Type : python类型
+_field = descriptor_pb2.FieldDescriptorProto
+_scalar_py_type = {
+    _field.TYPE_DOUBLE: float,
+    _field.TYPE_FLOAT: float,
+    _field.TYPE_INT64: int,
+    _field.TYPE_UINT64: int,
+    _field.TYPE_INT32: int,
+    _field.TYPE_FIXED64: int,
+    _field.TYPE_FIXED32: int,
+    _field.TYPE_BOOL: bool,
+    _field.TYPE_STRING: str,
+    _field.TYPE_BYTES: bytes,
+    _field.TYPE_UINT32: int,
+    _field.TYPE_ENUM: int,
+    _field.TYPE_SFIXED32: int,
+    _field.TYPE_SFIXED64: int,
+    _field.TYPE_SINT32: int,
+    _field.TYPE_SINT64: int,
+}
+
+# SourceCodeInfo.Location.path 中的字段编号
+_message_type_path = 4  # FileDescriptorProto.message_type
+_service_path = 6  # FileDescriptorProto.service
+_field_path = 2  # DescriptorProto.field
+_nested_type_path = 3  # DescriptorProto.nested_type
+_method_path = 2  # ServiceDescriptorProto.method
+
+
 class PyCodeHelper:
     mapping = {v: k for k, v in proto_base_type.items()}
 
@@ -46,11 +87,15 @@ class PyCodeHelper:
         target_dir: str,
         proto_dir: str,
         use_for: str = "client",
+        formatter="black",
+        workers: int = None,
     ):
         """python生成助手
         :param target_dir: 生成的代码地址
         :param proto_dir: 目前pb.py和pb2_grpc的存放地址
         :param use_for: 用于生成客户端或者服务端代码
+        :param formatter: 格式化方式 "black" / "none" / func(code) -> code
+        :param workers: 并行格式化的进程数 默认为cpu数
         """
         if not os.path.isdir(target_dir):
             raise ValueError("{} is not dictionary".format(target_dir))
@@ -59,13 +104,13 @@ class PyCodeHelper:
             raise ValueError("use_for should be client or server")
 
         self._use_for = use_for
+        self._formatter = _get_formatter(formatter)
+        self._workers = workers
 
         self._target_dir = target_dir
         self._pb_file_dir = proto_dir
 
         self._proto_files = []
-        self._pb2_files = []
-        self._pb2_grpc_files = []
 
         for file_name in os.listdir(self._pb_file_dir):
             if file_name.endswith(".proto"):
@@ -76,68 +121,157 @@ class PyCodeHelper:
         # 复制proto文件夹
         dst_dir = os.path.join(self._target_dir, "proto")
         os.makedirs(dst_dir, exist_ok=True)
+        outputs = []  # [(文件地址, 未格式化的代码)]
         for proto_name in self._proto_files:
             log.info("开始处理{}.proto".format(proto_name))
-            dst_proto_file = self._make_pb2_file(dst_dir, proto_name)
+            file_proto = self._make_pb2_file(dst_dir, proto_name)
+            proto = _ProtoFile(file_proto)
             # 生成model文件
-            models = self._generate_models_file(proto_name)
+            model_file, model_code, models = self._generate_models_file(
+                proto_name, proto
+            )
+            outputs.append((model_file, model_code))
             # 生成servicer文件
-            self._generate_service_file(proto_name, dst_proto_file, models)
+            outputs.append(self._generate_service_file(proto_name, proto, models))
+        self._write_files(outputs)
         log.info("在{}生成代码完成".format(self._target_dir))
 
-    def _make_pb2_file(self, dst_dir, proto_name):
+    def _write_files(self, outputs):
+        """
+        格式化并写入文件
+        文件首行记录未格式化代码的hash, hash未变化的文件不重新格式化也不重写
+        """
+        formatter_name = _get_formatter_name(self._formatter)
+        pending = []  # [(文件地址, 首行, 未格式化的代码)]
+        for file_path, code in outputs:
+            text = "\n".join([formatter_name, code])
+            digest = hashlib.sha256(text.encode("utf8")).hexdigest()
+            header = "{}{}\n".format(_digest_prefix, digest)
+            if _read_first_line(file_path) == header:
+                log.info("{} 未变化 跳过".format(file_path))
+                continue
+            pending.append((file_path, header, code))
+        codes = self._format([code for *_, code in pending])
+        for (file_path, header, _), code in zip(pending, codes):
+            with open(file_path, "w", encoding="utf8") as f:
+                f.write(header + code)
+
+    def _format(self, codes: List[str]) -> List[str]:
+        """格式化代码 black格式化多个文件时在进程池中并行"""
+        if self._formatter is None:
+            return codes
+        if (
+            self._formatter is _format_code
+            and len(codes) >= _parallel_threshold
+            and self._workers != 1
+        ):
+            # black 是CPU密集型 使用进程池 子进程使用spawn启动(grpc不支持fork)
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(self._workers, mp_context=mp_context) as executor:
+                return list(executor.map(_format_code, codes))
+        return [self._formatter(code) for code in codes]
+
+    def _make_pb2_file(self, dst_dir, proto_name) -> descriptor_pb2.FileDescriptorProto:
+        """复制proto文件并编译 返回protoc解析出的FileDescriptorProto"""
         src = os.path.join(self._pb_file_dir, proto_name + ".proto")
         dst_proto_file = os.path.join(dst_dir, proto_name + ".proto")
         copyfile(src, dst_proto_file)
-        log.info("start proto file:", proto_name)
-        generate_pb2_file(dst_proto_file)
-        return dst_proto_file
-
-    def _generate_models_file(self, proto_name: str) -> Iterator[str]:
-        """生成model文件"""
-        modules = {}
-        relationship = dict()  # 类名 : [依赖类1,依赖类2]
-        # 获取proto内容
-        proto_file = os.path.join(self._pb_file_dir, "{}.proto".format(proto_name))
-        with open(proto_file, "r", encoding="utf8") as f:
-            proto_file = f.read()
-        # 解析model
-        message_text = re.findall(r"message (\w*) ({[^\}]*})", proto_file)
-        for _name, _fields_code in message_text:
-            if _name[0].islower():
-                continue
-            field_codes, unknown_py_type = self._get_struct_from_proto(_fields_code)
-            modules[_name] = field_codes
-            relationship[_name] = unknown_py_type
-        # 判断依赖关系
-        model_code = open(model.__file__, "r", encoding="utf8").read()
-        relationship = list(relationship.items())
-        while len(relationship) != 0:
-            _name, required = relationship.pop(0)
-            if not required:
-                model_code += _get_no_required_model_code(_name, modules, relationship)
-            else:
-                relationship.append((_name, required))
-        # 输出
+        log.info("start proto file: {}".format(proto_name))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            descriptor_file = os.path.join(tmp_dir, proto_name + ".pb")
+            generate_pb2_file(dst_proto_file, descriptor_set_out=descriptor_file)
+            with open(descriptor_file, "rb") as f:
+                file_set = descriptor_pb2.FileDescriptorSet.FromString(f.read())
+        return file_set.file[0]
+
+    def _generate_models_file(
+        self, proto_name: str, proto: "_ProtoFile"
+    ) -> Tuple[str, str, List[str]]:
+        """生成model文件 返回 (文件地址, 代码, model名列表)"""
+        model_code, models = self._get_models_code(proto)
         model_file = os.path.join(self._target_dir, "model_{}.py".format(proto_name))
-        format_code = _format_code(model_code)
-        with open(model_file, "w", encoding="utf8") as f:
-            f.write(format_code)
-        return list(modules.keys())
+        return model_file, model_code, models
+
+    def _get_models_code(self, proto: "_ProtoFile") -> Tuple[str, List[str]]:
+        """
+        生成model文件的代码
+        被依赖的model先定义, 循环依赖的model使用字符串前向引用
+        在文件末尾 update_forward_refs 后再注册到frog
+        """
+        messages = {
+            _name: value
+            for _name, value in proto.messages.items()
+            if not _name[0].islower()
+        }
+        dependencies = {}  # 类名 : {依赖类1,依赖类2}
+        for _name, (message, _) in messages.items():
+            required = self._get_dependencies(proto, message)
+            unknown = required - messages.keys()
+            if unknown:
+                log.warning("{} 依赖的 {} 不在当前proto中".format(_name, sorted(unknown)))
+            dependencies[_name] = required & messages.keys()
+
+        model_code = open(model.__file__, "r", encoding="utf8").read()
+        defined = set()
+        forward_models = []
+        for _name in _sort_models(dependencies):
+            message, path = messages[_name]
+            # 还未定义的依赖(循环依赖 包括自身)
+            forward = dependencies[_name] - defined
+            field_codes, _ = self._get_struct_from_message(
+                proto, message, path, forward=forward
+            )
+            doc = proto.get_comment(path)
+            if doc:
+                field_codes.insert(0, _docstring(doc))
+            model_code += _get_model_code(_name, field_codes, register=not forward)
+            if forward:
+                forward_models.append(_name)
+            defined.add(_name)
+        for _name in forward_models:
+            model_code += "\n\n{0}.update_forward_refs()\nfrog.model()({0})\n".format(
+                _name
+            )
+        return model_code, list(messages)
+
+    def _get_dependencies(self, proto: "_ProtoFile", message) -> set:
+        """message字段中引用的其他message(不含基本类型)"""
+        required = set()
+        for field in message.field:
+            map_entry = proto.map_entries.get(field.type_name)
+            if map_entry is not None:
+                field = map_entry.field[1]
+            if field.type == _field.TYPE_MESSAGE:
+                message_type = proto.get_message_name(field.type_name)
+                if message_type not in self.mapping:
+                    required.add(message_type)
+        return required
 
     def _generate_service_file(
-        self, proto_name: str, dst_proto_file: str, models: Iterator[str]
-    ):
-        """生成接口文件"""
-        with open(dst_proto_file, "r", encoding="utf8") as f:
-            proto_body = f.read()
-        _rpc_re = r"rpc (\w*)\((\w*)\) returns \((\w*)\) \{\};"
-        func_list = re.findall(_rpc_re, proto_body)
+        self, proto_name: str, proto: "_ProtoFile", models: Iterator[str]
+    ) -> Tuple[str, str]:
+        """生成接口文件 返回 (文件地址, 代码)"""
         # 获得函数代码
         func_codes = ""
-        for _func_name, _req, _resp in func_list:
+        for method, path in proto.methods:
+            for type_name in (method.input_type, method.output_type):
+                if proto.is_nested(type_name):
+                    # pb2模块中嵌套message只能通过 Outer.Inner 访问 remote_method无法找到
+                    raise NotImplementedError(
+                        "rpc {} 使用了嵌套message {} 作为请求/返回 暂不支持".format(
+                            method.name, type_name.lstrip(".")
+                        )
+                    )
             # 转换成函数代码
-            _func_code = self._get_func_code(_func_name, _req, _resp, proto_body)
+            _func_code = self._get_func_code(
+                method.name,
+                proto.get_message_name(method.input_type),
+                proto.get_message_name(method.output_type),
+                proto,
+                request_stream=method.client_streaming,
+                response_stream=method.server_streaming,
+                doc=proto.get_comment(path),
+            )
             func_codes += _func_code + "\n\n"
         # 整合成文件
         out_text = _servicer_text.format(
@@ -146,93 +280,213 @@ class PyCodeHelper:
             func_code=func_codes,
             package_dir=self._target_dir,
         )
-        # 输出
         out_file = os.path.join(self._target_dir, "servicer_{}.py".format(proto_name))
-        format_code = _format_code(out_text)
-        with open(out_file, "w", encoding="utf8") as f:
-            f.write(format_code)
-        return
+        return out_file, out_text
 
-    def _get_struct_from_proto(
-        self, proto: str, function_args: bool = False
+    def _get_struct_from_message(
+        self,
+        proto: "_ProtoFile",
+        message: descriptor_pb2.DescriptorProto,
+        path: tuple,
+        function_args: bool = False,
+        forward=(),
     ) -> Tuple[List[str], List[str]]:
         """
         将proto文件的message
         field
         转换成python代码
+        :param forward: 还未定义的model 使用字符串前向引用
         """
         unknown_py_type = []
-        field_list = proto[proto.find("{") + 1 : proto.rfind(";")].split(";")
 
-        def _get_type(message_type):
+        def _get_type(field):
             """获取CMessages对应的python类型，并记录自定义类型"""
-            if message_type in self.mapping:
-                class_obj = self.mapping[message_type]
-                ret: str = class_obj.__module__ + "." + class_obj.__qualname__
-                if ret.startswith("builtins."):
-                    ret = ret.replace("builtins.", "")
-                return ret
+            if field.type in _scalar_py_type:
+                class_obj = _scalar_py_type[field.type]
             else:
-                unknown_py_type.append(message_type)
-                return message_type
+                message_type = proto.get_message_name(field.type_name)
+                if message_type not in self.mapping:
+                    unknown_py_type.append(message_type)
+                    if message_type in forward:
+                        return '"{}"'.format(message_type)
+                    return message_type
+                class_obj = self.mapping[message_type]
+            ret: str = class_obj.__module__ + "." + class_obj.__qualname__
+            if ret.startswith("builtins."):
+                ret = ret.replace("builtins.", "")
+            return ret
 
         ret_params = []
-        for field in field_list:
-            field = field.strip()
-            if field.startswith("repeated"):
-                _, _type, _name, *_ = field.split()
-                _type_text = _get_type(_type)
+        for index, field in enumerate(message.field):
+            map_entry = proto.map_entries.get(field.type_name)
+            if map_entry is not None:
+                _key = _get_type(map_entry.field[0])
+                _value = _get_type(map_entry.field[1])
                 if function_args:
-                    _str = "{}: List[{}] = None".format(_name, _type_text)
+                    _str = "{}: Dict[{}, {}] = None".format(field.name, _key, _value)
                 else:
-                    _str = "{}: List[{}] = {}()".format(_name, _type_text, "list")
-                ret_params.append(_str)
-            elif field.startswith("map"):
-                field = field.replace("<", " ").replace(",", " ").replace(">", " ")
-                _, _type_key, _type_value, _name, *_ = field.split()
-                _key = _get_type(_type_key)
-                _value = _get_type(_type_value)
+                    _str = "{}: Dict[{}, {}] = {}()".format(
+                        field.name, _key, _value, "dict"
+                    )
+            elif field.label == _field.LABEL_REPEATED:
+                _type_text = _get_type(field)
                 if function_args:
-                    _str = "{}: Dict[{}, {}] = None".format(_name, _key, _value)
+                    _str = "{}: List[{}] = None".format(field.name, _type_text)
+                else:
+                    _str = "{}: List[{}] = {}()".format(field.name, _type_text, "list")
+            else:
+                _type_text = _get_type(field)
+                if _type_text.startswith('"'):
+                    # 前向引用的model 没有默认实例
+                    _str = "{}: {} = None".format(field.name, _type_text)
                 else:
-                    _str = "{}: Dict[{}, {}] = {}()".format(_name, _key, _value, "dict")
-                ret_params.append(_str)
-            elif field:
-                _type, _name, *_ = field.split()
-                _type_text = _get_type(_type)
-                _default_value = proto_type_recorder.get_py_default_value(_type_text)
-                ret_params.append(
-                    "{}: {} = {}()".format(_name, _type_text, _default_value)
-                )
-            else:  # field = ""
-                print("[warming] 空 message: {} ".format(proto.replace("\n", "")))
+                    _default_value = proto_type_recorder.get_py_default_value(
+                        _type_text
+                    )
+                    _str = "{}: {} = {}()".format(field.name, _type_text, _default_value)
+            comment = proto.get_comment(path + (_field_path, index))
+            if comment and not function_args:
+                _str += "  # " + " ".join(comment.split())
+            ret_params.append(_str)
+        if not ret_params:
+            log.warning("空 message: {}".format(message.name))
         return ret_params, unknown_py_type
 
     def _get_func_code(
-        self, func_name: str, req: str, resp: str, proto_body: str
+        self,
+        func_name: str,
+        req: str,
+        resp: str,
+        proto: "_ProtoFile",
+        request_stream: bool = False,
+        response_stream: bool = False,
+        doc: str = None,
     ) -> str:
-        if "_" in req:
-            _re_result = re.findall("message {}[^}}]*}}".format(req), proto_body)
-            message_text = _re_result[0]
+        method_args = resp
+        if request_stream:
+            # stream 请求 参数为对应model的迭代器
+            args = ["request_iterator: Iterator[{}]".format(req)]
+        else:
             # 获取函数输入输出
-            req, _ = self._get_struct_from_proto(message_text, function_args=True)
+            message, path = proto.messages[req]
+            args, _ = self._get_struct_from_message(
+                proto, message, path, function_args=True
+            )
+            if req != "{}_request".format(func_name) and not req[0].islower():
+                # 请求是一个独立的model 参数与model字段一致
+                method_args = "{}, request_model={}".format(resp, req)
+        body = (
+            "...  # pragma: no cover"
+            if self._use_for == "client"
+            else "raise NotImplementedError"
+        )
+        if doc:
+            body = _docstring(doc) + "\n    " + body
         if self._use_for == "client":
-            func_code = """@servicer.remote_method({})\ndef {}({}) -> {}:\n    ...  # pragma: no cover\n"""
+            func_code = """@servicer.remote_method({})\ndef {}({}) -> {}:\n    {}\n"""
         else:
-            func_code = """@servicer.grpc_method({})\ndef {}({}) -> {}:\n    raise NotImplementedError\n"""
-        return func_code.format(resp, func_name, ", ".join(req), resp)
+            func_code = """@servicer.grpc_method({})\ndef {}({}) -> {}:\n    {}\n"""
+        return_type = "Iterator[{}]".format(resp) if response_stream else resp
+        return func_code.format(
+            method_args, func_name, ", ".join(args), return_type, body
+        )
+
+
+class _ProtoFile:
+    """
+    FileDescriptorProto的索引 一次遍历建立 后续查找都是O(1)
+
+    messages: python类名 : (DescriptorProto, source path) 嵌套message展开为 Outer_Inner
+    map_entries: map字段的entry全名 : DescriptorProto
+    methods: [(MethodDescriptorProto, source path)]
+    """
+
+    def __init__(self, file_proto: descriptor_pb2.FileDescriptorProto):
+        self._package = "." + file_proto.package if file_proto.package else ""
+        self.messages = {}
+        self.map_entries = {}
+        self._full_names = {}  # message全名 : python类名
+        self._nested = set()  # 嵌套message的全名
+        self._comments = {}  # source path : 注释
+        for location in file_proto.source_code_info.location:
+            comment = (location.leading_comments or location.trailing_comments).strip()
+            if comment:
+                self._comments[tuple(location.path)] = comment
+        for index, message in enumerate(file_proto.message_type):
+            self._add_message(message, self._package, "", (_message_type_path, index))
+        self.methods = [
+            (method, (_service_path, s_index, _method_path, m_index))
+            for s_index, service in enumerate(file_proto.service)
+            for m_index, method in enumerate(service.method)
+        ]
+
+    def _add_message(self, message, scope, prefix, path):
+        full_name = "{}.{}".format(scope, message.name)
+        if message.options.map_entry:
+            self.map_entries[full_name] = message
+            return
+        py_name = prefix + message.name
+        if prefix:
+            self._nested.add(full_name)
+        self._full_names[full_name] = py_name
+        self.messages[py_name] = (message, path)
+        for index, nested in enumerate(message.nested_type):
+            self._add_message(
+                nested, full_name, py_name + "_", path + (_nested_type_path, index)
+            )
+
+    def get_message_name(self, type_name: str) -> str:
+        """
+        message全名转换成python中的名字
+        e.g. .hello_d.TDemoModel -> TDemoModel, .google.protobuf.Timestamp -> google.protobuf.Timestamp
+        """
+        if type_name in self._full_names:
+            return self._full_names[type_name]
+        return type_name.lstrip(".")
+
+    def is_nested(self, type_name: str) -> bool:
+        """是否是定义在其他message内部的message"""
+        return type_name in self._nested
+
+    def get_comment(self, path: tuple) -> str:
+        return self._comments.get(path)
 
 
-def _get_no_required_model_code(
-    _name: str, modules: Dict[str, List[str]], relationship: List[Tuple[str, List[str]]]
-):
-    model_template = "\n\n@frog.model()\nclass {}(BaseModel):\n    {}\n"
-    ret = model_template.format(_name, "\n    ".join(modules[_name]))
-    # 依赖关系图中去除已写入的model
-    for _, _required in relationship:
-        if _name in _required:
-            _required.pop()
-    return ret
+def _docstring(comment: str) -> str:
+    """proto注释转换成docstring"""
+    comment = comment.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    return '"""{}"""'.format(comment.replace("\n", "\n    "))
+
+
+def _sort_models(dependencies: Dict[str, set]) -> List[str]:
+    """
+    按依赖关系对model拓扑排序 被依赖的model在前
+    循环依赖(以及依赖了循环的)model无法排序, 按原顺序放在最后
+    """
+    in_degree = {}
+    dependents = defaultdict(list)  # 类名 : [依赖它的类]
+    for _name, required in dependencies.items():
+        in_degree[_name] = len(required)
+        for dependency in required:
+            dependents[dependency].append(_name)
+    ready = deque(_name for _name, degree in in_degree.items() if degree == 0)
+    order = []
+    while ready:
+        _name = ready.popleft()
+        order.append(_name)
+        for dependent in dependents[_name]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                ready.append(dependent)
+    return order + [_name for _name, degree in in_degree.items() if degree > 0]
+
+
+def _get_model_code(_name: str, field_codes: List[str], register: bool = True) -> str:
+    """model代码 register=False时不注册到frog(等待解析前向引用)"""
+    decorator = "@frog.model()\n" if register else ""
+    return "\n\n{}class {}(BaseModel):\n    {}\n".format(
+        decorator, _name, "\n    ".join(field_codes or ["pass"])
+    )
 
 
 def _format_code(code: str) -> str:
@@ -249,10 +503,54 @@ def _format_code(code: str) -> str:
     return format_ret
 
 
+def _get_formatter(formatter):
+    """格式化方式 返回None时不格式化"""
+    if formatter == "black":
+        return _format_code
+    if formatter in (None, "none"):
+        return None
+    if callable(formatter):
+        return formatter
+    raise ValueError("format should be black, none or a callable")
+
+
+def _get_formatter_name(formatter) -> str:
+    """格式化方式的标识 格式化方式或black版本变化时重新生成"""
+    if formatter is None:
+        return "none"
+    if formatter is _format_code:
+        try:
+            from importlib.metadata import version
+
+            return "black-{}".format(version("black"))
+        except Exception:  # pragma: no cover
+            return "black"
+    return "{}.{}".format(formatter.__module__, formatter.__qualname__)
+
+
+def _read_first_line(file_path: str) -> str:
+    if not os.path.exists(file_path):
+        return ""
+    with open(file_path, "r", encoding="utf8") as f:
+        return f.readline()
+
+
 def generate_py_code(
-    package_dir: str, proto_dir: str = None, use_for: str = "client"
+    package_dir: str,
+    proto_dir: str = None,
+    use_for: str = "client",
+    format="black",  # noqa: A002
+    workers: int = None,
 ) -> None:
-    """生成python文件"""
+    """
+    生成python文件
+
+    :param package_dir: 生成的代码地址
+    :param proto_dir: proto文件所在目录 默认为 package_dir/proto
+    :param use_for: 用于生成客户端或者服务端代码
+    :param format: 格式化方式 "black" / "none" / func(code) -> code
+    :param workers: 并行格式化的进程数 默认为cpu数
+    """
     if proto_dir is None:
         proto_dir = os.path.join(package_dir, "proto")
-    PyCodeHelper(package_dir, proto_dir, use_for).generate_code()
+    PyCodeHelper(package_dir, proto_dir, use_for, format, workers).generate_code()
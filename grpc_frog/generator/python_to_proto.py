@@ -6,7 +6,14 @@ import os
 
 from grpc_frog import Servicer, frog
 from grpc_frog.core import log, proto_type_recorder
-from grpc_frog.generator.pb_fiile_util import generate_pb2_file
+from grpc_frog.core.descriptor import get_required_message_types
+from grpc_frog.generator.pb_fiile_util import (
+    generate_pb2_file,
+    generate_pb2_files,
+    get_proto_digest,
+    restore_pb2_file,
+    save_pb2_file,
+)
 
 proto_text = """syntax = "proto3";\n\npackage {};\n\nimport "google/protobuf/timestamp.proto";\n\n{}\n\n{}"""
 
@@ -17,12 +24,18 @@ class ProtoHelper:
         servicer_name: str = None,
         save_dir: str = None,
         proto_location: str = None,
+        cache_dir: str = None,
+        batch: bool = False,
+        workers: int = None,
     ):
         """
         Args:
             servicer_name: 转换的服务名称
             save_dir: proto文件保存位置
             proto_location: proto文件package相对位置
+            cache_dir: 共享的pb2缓存目录 默认读取环境变量 grpc_frog__proto_cache_dir
+            batch: 所有servicer的proto文件写完后 同一目录的文件只调用一次protoc
+            workers: 大于1时 所有proto文件写完后用进程池并行编译
         """
         if servicer_name:
             self._servicer_list = [frog.servicer_map[servicer_name]]
@@ -30,53 +43,73 @@ class ProtoHelper:
             self._servicer_list = frog.servicer_map.values()
         self._save_dir = save_dir
         self._proto_location = proto_location or "grpc_frog.proto"
+        self._cache_dir = cache_dir
+        self._batch = batch
+        self._workers = workers
 
     def generate_code(self):
+        pending = []  # [(proto_file, digest)] 需要编译的proto文件
         for servicer in self._servicer_list:
             if not servicer.bind_method_map:
                 log.info("{} has no bind method".format(servicer.name))
                 continue
             out_dir = self._save_dir or servicer.proto_dir
             proto_file = os.path.join(out_dir, "{}.proto".format(servicer.name))
-            self._generate_proto_file(servicer, proto_file)
+            digest = self._generate_proto_file(servicer, proto_file)
+            if digest is None:
+                continue
+            if self._batch or (self._workers and self._workers > 1):
+                pending.append((proto_file, digest))
+            else:
+                # 生成pb2文件
+                generate_pb2_file(proto_file)
+                save_pb2_file(proto_file, digest, self._cache_dir)
+        if pending:
+            generate_pb2_files(
+                [proto_file for proto_file, _ in pending], workers=self._workers
+            )
+            for proto_file, digest in pending:
+                save_pb2_file(proto_file, digest, self._cache_dir)
 
     def _generate_proto_file(self, servicer: Servicer, proto_file: str):
-        """生成proto文件"""
-        required_proto_type = set()
-        for _method in servicer.bind_method_map.values():
-            for msg in _method.py_type_set:
-                required_proto_type.add(msg)
-
-        required_message_type = required_proto_type - set(
-            proto_type_recorder.proto_base_type.keys()
-        )
+        """
+        生成proto文件
+        :return: 需要编译时返回proto内容的hash 否则返回None
+        """
+        required_message_type = get_required_message_types(servicer)
 
         if len(required_message_type) == 0:
             # no message means no modules and method
-            return
+            return None
         # proto
         proto_str = self._get_service_body(servicer)
-        # 准备rpc需要的message body
-        proto_message_types = [
+        # 准备rpc需要的message body 按名称排序 保证每次生成的内容一致
+        proto_message_types = sorted(
             proto_type_recorder.translate_2_proto_message(i)
             for i in required_message_type
-        ]
+        )
         messages = "\n\n".join(proto_message_types)
         # 拼装成proto文件
         proto_body = proto_text.format(servicer.name, messages, proto_str)
+        # 内容没有变化时复用之前的编译结果
+        digest = get_proto_digest(proto_body)
+        if restore_pb2_file(proto_file, digest, self._cache_dir):
+            log.info("{} 未变化 跳过编译".format(proto_file))
+            return None
         # save
         with open(proto_file, "w", encoding="utf8") as f:
             f.write(proto_body)
-        # 生成pb2文件
-        generate_pb2_file(proto_file)
+        return digest
 
     def _get_service_body(self, servicer: Servicer) -> str:
         """获取method的proto形式"""
         ret = []
         for method in servicer.bind_method_map.values():
-            rpc_body = "rpc {method_name}({request_name}) returns ({response_name}) {{}};".format(
+            rpc_body = "rpc {method_name}({request_stream}{request_name}) returns ({response_stream}{response_name}) {{}};".format(
                 method_name=method.name,
+                request_stream="stream " if method.request_streaming else "",
                 request_name=method.request_name,
+                response_stream="stream " if method.response_streaming else "",
                 response_name=method.response_name,
             )
             ret.append(rpc_body)
@@ -88,7 +121,12 @@ class ProtoHelper:
 
 
 def generate_proto_file(
-    servicer_name: str = None, save_dir: str = None, proto_location: str = None
+    servicer_name: str = None,
+    save_dir: str = None,
+    proto_location: str = None,
+    cache_dir: str = None,
+    batch: bool = False,
+    workers: int = None,
 ):
     """
     生成proto文件
@@ -97,7 +135,15 @@ def generate_proto_file(
         servicer_name: 服务名称
         save_dir: proto文件保存位置
         proto_location: proto文件package相对位置
+        cache_dir: 共享的pb2缓存目录 默认读取环境变量 grpc_frog__proto_cache_dir
+        batch: 同一目录的多个proto文件只调用一次protoc
+        workers: 并行编译proto文件的进程数
     """
     ProtoHelper(
-        servicer_name=servicer_name, save_dir=save_dir, proto_location=proto_location
+        servicer_name=servicer_name,
+        save_dir=save_dir,
+        proto_location=proto_location,
+        cache_dir=cache_dir,
+        batch=batch,
+        workers=workers,
     ).generate_code()
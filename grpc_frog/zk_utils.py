@@ -3,52 +3,311 @@
 # Created by zza on 2021/2/4 10:41
 # Copyright 2021 LinkSense Technology CO,. Ltd
 
+import atexit
+import functools
 import json
+import os
 import random
+import threading
 import time
 
 from kazoo.client import KazooClient
+from kazoo.exceptions import NoNodeError
+from kazoo.protocol.states import KazooState
 
+from grpc_frog.core.context import log
 
-def register_zk(server_host, server_port, server_name, zk_host, zk_port):
+# 上报负载的最小间隔(秒) 避免写入过于频繁
+_min_report_interval = 1.0
+
+# 进程内共享的zookeeper会话 hosts : [KazooClient, 引用数]
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_zk_client(hosts: str) -> KazooClient:
+    """
+    获取连接到hosts的共享KazooClient 每个zookeeper集群在进程内只建立一个会话
+    用完后调用 release_zk_client
+    :param hosts: kazoo的hosts e.g. 10.0.0.1:2181,10.0.0.2:2181
+    """
+    # 地址顺序不同的同一个集群共用会话
+    hosts = ",".join(sorted(i.strip() for i in hosts.split(",") if i.strip()))
+    with _clients_lock:
+        if hosts not in _clients:
+            zk_client = KazooClient(hosts=hosts)
+            zk_client.start()
+            _clients[hosts] = [zk_client, 0]
+        _clients[hosts][1] += 1
+        return _clients[hosts][0]
+
+
+def release_zk_client(zk_client):
+    """释放get_zk_client获取的KazooClient 没有使用者时关闭会话"""
+    with _clients_lock:
+        for hosts, item in list(_clients.items()):
+            if item[0] is zk_client:
+                item[1] -= 1
+                if item[1] > 0:
+                    return
+                del _clients[hosts]
+                break
+        else:
+            return
+    zk_client.stop()
+    zk_client.close()
+
+
+@atexit.register
+def _close_clients():
+    """退出时关闭全部会话 临时节点立即删除 不必等待会话超时"""
+    with _clients_lock:
+        clients = [i[0] for i in _clients.values()]
+        _clients.clear()
+    for zk_client in clients:
+        try:
+            zk_client.stop()
+            zk_client.close()
+        except Exception as err:
+            log.warning("关闭zookeeper连接失败: {}".format(err))
+
+
+# fork出的子进程没有父进程的连接线程 需要建立自己的会话
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clients.clear)
+
+
+def register_zk(
+    server_host,
+    server_port,
+    server_name,
+    zk_host,
+    zk_port,
+    weight=1,
+    capacity=None,
+    servicer=None,
+    report_interval=5.0,
+):
     """
     服务端注册到zookeeper
+    :param weight: 权重 e.g. cpu核数, client按权重分配请求
+    :param capacity: 能同时处理的请求数 client按剩余容量降低权重
+    :param servicer: 传入frog的Servicer时 定期把它的负载(inflight/latency_ms)写入节点
+    :param report_interval: 上报负载的间隔(秒) 最小1秒 负载没有明显变化时不写入
+    :return: ZkRegistration 调用close()注销
     """
-    zk = KazooClient(hosts="{host}:{port}".format(host=zk_host, port=zk_port))
-    zk.start()
-    zk.ensure_path("/{}".format(server_name))  # 创建根节点
-    value = json.dumps({"host": server_host, "port": server_port})
-    # 创建服务子节点
-    zk.create(
-        "/{}/{}_".format(server_name, int(time.time())),
-        value.encode(),
-        ephemeral=True,
-        sequence=True,
+    zk = get_zk_client("{host}:{port}".format(host=zk_host, port=zk_port))
+    data = {"host": server_host, "port": server_port, "weight": weight}
+    if capacity is not None:
+        data["capacity"] = capacity
+    return ZkRegistration(
+        zk,
+        server_name,
+        data,
+        load_stats=servicer.load_stats if servicer is not None else None,
+        report_interval=report_interval,
+        own_client=True,
     )
 
 
+class ZkRegistration(object):
+    """
+    一个服务节点 可以定期上报负载
+    会话过期后临时节点被zookeeper删除, 重新连接时用最新的数据重新创建
+    """
+
+    def __init__(
+        self,
+        zk_client,
+        server_name,
+        data: dict,
+        load_stats=None,
+        report_interval=5.0,
+        own_client=False,
+    ):
+        """
+        :param zk_client: 已启动的KazooClient
+        :param data: 节点数据 {"host", "port", "weight", "capacity"}
+        :param load_stats: grpc_frog.core.load.LoadStats 为None时不上报负载
+        :param own_client: zk_client由get_zk_client获取 close时释放
+        """
+        self._zk = zk_client
+        self._own_client = own_client
+        self.server_name = server_name
+        self.data = dict(data)
+        self._load_stats = load_stats
+        self._interval = max(report_interval, _min_report_interval)
+        self._reported = {}  # 上次写入的负载
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()  # 上报和重新注册不同时写入
+        self._session_lost = False
+        self.path = self._create()
+        self._zk.add_listener(self._on_state)
+        if load_stats is not None:
+            threading.Thread(
+                target=self._run, name="grpc_frog-zk-report", daemon=True
+            ).start()
+
+    def _create(self) -> str:
+        """创建服务子节点 返回节点路径"""
+        self._zk.ensure_path("/{}".format(self.server_name))  # 创建根节点
+        return self._zk.create(
+            "/{}/{}_".format(self.server_name, int(time.time())),
+            json.dumps(dict(self.data, **self._reported)).encode(),
+            ephemeral=True,
+            sequence=True,
+        )
+
+    def _on_state(self, state):
+        """zookeeper连接状态变化 在kazoo的连接线程中调用 不能阻塞"""
+        if state == KazooState.LOST:
+            self._session_lost = True
+        elif state == KazooState.CONNECTED and self._session_lost:
+            self._session_lost = False
+            threading.Thread(
+                target=self._restore, name="grpc_frog-zk-restore", daemon=True
+            ).start()
+
+    def _restore(self):
+        """会话过期后重新创建临时节点"""
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            try:
+                self.path = self._create()
+            except Exception as err:
+                # 再次断开时 重新连接后还会尝试
+                log.warning("{} 重新注册失败: {}".format(self.server_name, err))
+                return
+        log.info("{} 会话过期后重新注册 {}".format(self.server_name, self.path))
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.report()
+            except Exception as err:
+                log.warning("{} 上报负载失败: {}".format(self.path, err))
+
+    def report(self, force=False) -> bool:
+        """把当前负载写入节点 负载没有明显变化时跳过 返回是否写入"""
+        load = self._load_stats.snapshot()
+        if not force and not _load_changed(self._reported, load):
+            return False
+        with self._lock:
+            self._zk.set(self.path, json.dumps(dict(self.data, **load)).encode())
+            self._reported = load
+        return True
+
+    def close(self):
+        """停止上报 删除节点"""
+        with self._lock:
+            self._stopped.set()
+        self._zk.remove_listener(self._on_state)
+        try:
+            self._zk.delete(self.path)
+        except NoNodeError:
+            pass
+        if self._own_client:
+            release_zk_client(self._zk)
+
+
+def _load_changed(old: dict, new: dict) -> bool:
+    """进行中请求数变化 或 延迟变化超过10%"""
+    if not old or old["inflight"] != new["inflight"]:
+        return True
+    return abs(new["latency_ms"] - old["latency_ms"]) > old["latency_ms"] * 0.1
+
+
 class DistributedChannel(object):
-    """分布式服务 - 获取服务连接方式的类"""
+    """
+    分布式服务 - 获取服务连接方式的类
 
-    def __init__(self, host, port, servicer_name):
-        self.servicer_name = servicer_name
-        self._zk = KazooClient(hosts="{host}:{port}".format(host=host, port=port))
-        self._zk.start()
-        self._get_servers()
+    通过 ChildrenWatch 监听服务节点列表, 只为新增的节点注册 DataWatch 读取地址,
+    下线的节点直接从缓存中删除; 服务列表以不可变的tuple发布, get_server 读取时不加锁
+    """
 
-    def _get_servers(self, event=None):
+    def __init__(self, host, port, servicer_name, zk_client=None):
         """
-        从zookeeper获取服务器地址信息列表
+        :param port: 为None时 host为kazoo的hosts e.g. 10.0.0.1:2181,10.0.0.2:2181
+        :param zk_client: 已启动的KazooClient 默认使用进程内共享的会话 见get_zk_client
         """
-        servers = self._zk.get_children(
-            "/{}".format(self.servicer_name), watch=self._get_servers
-        )
-        self._servers = []
-        for server in servers:
-            data = self._zk.get("/{}/{}".format(self.servicer_name, server))[0]
-            if data:
-                addr = json.loads(data.decode())
-                self._servers.append(addr)
+        self.servicer_name = servicer_name
+        self._own_client = zk_client is None
+        if zk_client is None:
+            hosts = host if port is None else "{}:{}".format(host, port)
+            zk_client = get_zk_client(hosts)
+        self._zk = zk_client
+        self._closed = False
+        self._listeners = []  # 服务列表变化时的回调 func(servers)
+        self._lock = threading.RLock()
+        self._nodes = {}  # node_name : addr 节点被删除或数据为空时为None
+        self._loading = set()  # 正在读取数据的新节点 读取完后统一发布
+        self._servers = ()  # 发布的服务列表快照
+        self._zk.ChildrenWatch("/{}".format(self.servicer_name), self._on_children)
+
+    def _on_children(self, children):
+        """服务节点列表变化 只读取新增节点的数据 返回False时停止监听"""
+        if self._closed:
+            return False
+        children = set(children)
+        with self._lock:
+            added = children - self._nodes.keys()
+            for node in self._nodes.keys() - children:
+                del self._nodes[node]
+            for node in added:
+                self._nodes[node] = None
+            self._loading.update(added)
+        try:
+            for node in sorted(added):
+                self._zk.DataWatch(
+                    "/{}/{}".format(self.servicer_name, node),
+                    functools.partial(self._on_data, node),
+                )
+        finally:
+            with self._lock:
+                self._loading.difference_update(added)
+        self._publish()
+
+    def _on_data(self, node, data, stat, event=None):
+        """节点数据变化 返回False时停止监听(节点已下线)"""
+        with self._lock:
+            if self._closed or node not in self._nodes:
+                return False
+            self._nodes[node] = json.loads(data.decode()) if data else None
+            loading = node in self._loading
+        if not loading:
+            self._publish()
+
+    def _publish(self):
+        """发布新的服务列表 有变化时通知listener"""
+        with self._lock:
+            servers = tuple(
+                addr for _, addr in sorted(self._nodes.items()) if addr is not None
+            )
+            if servers == self._servers:
+                return
+            self._servers = servers
+        for listener in list(self._listeners):
+            listener(servers)
+
+    def add_listener(self, listener):
+        """注册服务列表变化的回调 参数为当前全部服务信息 get_servers()"""
+        self._listeners.append(listener)
+
+    def get_servers(self) -> tuple:
+        """当前全部可用服务的信息 不可变的快照"""
+        return self._servers
+
+    def get_targets(self):
+        """当前全部可用服务的 host:port"""
+        return ["{}:{}".format(i.get("host"), i.get("port")) for i in self._servers]
+
+    def close(self):
+        """停止监听 释放共享的会话"""
+        self._closed = True
+        self._listeners.clear()
+        if self._own_client:
+            release_zk_client(self._zk)
 
     def get_server(self):
         """
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+_benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def pytest_collection_modifyitems(config, items):
+    """benchmark只在 pytest --benchmark-only 时运行 默认的测试只跑功能测试"""
+    if config.getoption("benchmark_only"):
+        return
+    skip = pytest.mark.skip(reason="benchmark 请使用 pytest --benchmark-only 运行")
+    for item in items:
+        if str(item.fspath).startswith(_benchmark_dir):
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def bench_proto_dir(tmp_path_factory):
+    from tests.benchmark.interface import generate_proto
+
+    proto_dir = str(tmp_path_factory.mktemp("bench") / "proto")
+    generate_proto(proto_dir)
+    return proto_dir
+
+
+@pytest.fixture(scope="session")
+def bench_server(bench_proto_dir):
+    from tests.benchmark.interface import run_server
+
+    server, address = run_server()
+    yield address
+    server.stop(None)
+
+
+@pytest.fixture(scope="session")
+def bench_client(bench_server, bench_proto_dir):
+    from tests.benchmark.interface import make_client
+
+    client = make_client(bench_server, bench_proto_dir)
+    yield client
+    client.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""benchmark用的servicer"""
+import os
+from concurrent import futures
+from typing import Dict, List
+
+import grpc
+from pydantic import BaseModel
+
+from grpc_frog import frog
+from grpc_frog.core.servicer import Servicer
+
+servicer_name = "frog_bench"
+bench_servicer = Servicer(servicer_name)
+frog.add_servicer(bench_servicer)
+
+
+@frog.model()
+class BenchModel(BaseModel):
+    int_field: int = 0
+    str_field: str = ""
+
+
+@frog.model()
+class NestedModel(BaseModel):
+    name: str = ""
+    inner: BenchModel = BenchModel()
+    tags: Dict[str, int] = dict()
+
+
+class RepeatedModel(BaseModel):
+    numbers: List[int] = list()
+    items: List[NestedModel] = list()
+
+
+@bench_servicer.grpc_method()
+def echo(int_field: int, str_field: str) -> BenchModel:
+    return BenchModel(int_field=int_field, str_field=str_field)
+
+
+@bench_servicer.grpc_method()
+def bulk(numbers: List[int], items: List[NestedModel]) -> RepeatedModel:
+    return RepeatedModel(numbers=numbers, items=items)
+
+
+def generate_proto(proto_dir: str) -> None:
+    """生成proto文件"""
+    from grpc_frog import generate_proto_file
+
+    os.makedirs(proto_dir, exist_ok=True)
+    bench_servicer.proto_dir = proto_dir
+    generate_proto_file(servicer_name=servicer_name, save_dir=proto_dir)
+
+
+def run_server() -> (grpc.Server, str):
+    """在当前进程启动server 返回server与地址"""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    frog.bind_servicer(server, bench_servicer)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    return server, "127.0.0.1:{}".format(port)
+
+
+def make_client(address: str, proto_dir: str) -> Servicer:
+    """生成一个独立的client servicer(不注册到frog 避免和server同名冲突)"""
+    client = Servicer(servicer_name, proto_dir=proto_dir)
+
+    @client.remote_method()
+    def echo(int_field: int, str_field: str) -> BenchModel:
+        ...  # pragma: no cover
+
+    client.client_init("grpc://{}/{}".format(address, servicer_name))
+    return client
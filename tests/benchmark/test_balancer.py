@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+负载均衡策略的尾延迟对比
+
+同一进程中启动3个server, 其中一个每次请求慢20ms, 8个线程并发调用
+extra_info 中记录每个策略的 p50/p99 延迟(ms)
+"""
+
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from grpc_frog.core.resolver import set_memory_servers
+
+_fast_delay = 0.001
+_slow_delay = 0.02
+
+
+class _DelayServicer:
+    """每个server单独的servicer 处理前等待delay秒 与pb2_grpc中的servicer一起继承"""
+
+    def __init__(self, pb2, delay):
+        self._pb2 = pb2
+        self._delay = delay
+
+    def echo(self, request, _context):
+        time.sleep(self._delay)
+        return self._pb2.BenchModel(
+            int_field=request.int_field, str_field=request.str_field
+        )
+
+
+@pytest.fixture(scope="module")
+def backends(bench_proto_dir):
+    from tests.benchmark.interface import bench_servicer
+
+    pb2 = bench_servicer.get_pb2()
+    pb2_grpc = bench_servicer.get_pb2_grpc()
+    servicer_class = type(
+        "DelayServicer", (_DelayServicer, pb2_grpc.frog_benchServicer), {}
+    )
+    servers, addresses = [], []
+    for delay in (_slow_delay, _fast_delay, _fast_delay):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+        pb2_grpc.add_frog_benchServicer_to_server(servicer_class(pb2, delay), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        servers.append(server)
+        addresses.append({"host": "127.0.0.1", "port": port})
+    yield addresses
+    for server in servers:
+        server.stop(None)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent))]
+
+
+@pytest.mark.parametrize(
+    "lb_policy",
+    ["random", "round_robin", "least_outstanding", "p2c_ewma", "grpc_round_robin"],
+)
+@pytest.mark.benchmark(group="balancer-slow-backend")
+def test_slow_backend(benchmark, backends, bench_proto_dir, lb_policy):
+    from tests.benchmark.interface import make_client
+
+    set_memory_servers("slow_backend", backends)
+    client = make_client("127.0.0.1:{}".format(backends[0]["port"]), bench_proto_dir)
+    client.client_init("memory://slow_backend/frog_bench", lb_policy=lb_policy)
+    echo = client.bind_method_map["echo"].func
+
+    def call(i):
+        start = time.perf_counter()
+        echo(i, "a")
+        return time.perf_counter() - start
+
+    def run():
+        with futures.ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(call, range(400)))
+
+    latencies = benchmark.pedantic(run, rounds=1, iterations=1)
+    benchmark.extra_info["p50_ms"] = round(_percentile(latencies, 0.5) * 1000, 2)
+    benchmark.extra_info["p99_ms"] = round(_percentile(latencies, 0.99) * 1000, 2)
+    client.close()
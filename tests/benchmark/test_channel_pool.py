@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""remote_method 每次新建channel 与 复用连接池 的对比"""
+import grpc
+import pytest
+
+
+@pytest.mark.benchmark(group="remote_method-channel")
+def test_channel_per_call(benchmark, bench_client, bench_server):
+    """旧实现: 每次调用都新建channel和stub"""
+    _m = bench_client.bind_method_map["echo"]
+    stub_class = getattr(bench_client.get_pb2_grpc(), "frog_benchStub")
+
+    def call():
+        message = _m.request_ret_2_message({"int_field": 1, "str_field": "a"})
+        with grpc.insecure_channel(bench_server) as channel:
+            result = stub_class(channel).echo(message)
+        return _m.response_model(**_m.response_message_2_dict(result))
+
+    assert benchmark(call).int_field == 1
+
+
+@pytest.mark.benchmark(group="remote_method-channel")
+def test_channel_pooled(benchmark, bench_client):
+    """连接池: channel在client_init时建立 之后复用"""
+    echo = bench_client.bind_method_map["echo"].func
+    assert benchmark(echo, 1, "a").int_field == 1
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""
+client端每次调用的额外开销
+
+server在同一进程中 echo不做任何处理, 直接调用stub为下限(grpc+序列化)
+"""
+import inspect
+
+import pytest
+
+
+@pytest.mark.benchmark(group="remote_method-overhead")
+def test_raw_stub(benchmark, bench_client):
+    """下限: 直接用stub发送事先构造好的CMessage"""
+    _m = bench_client.bind_method_map["echo"]
+    call = bench_client.get_stub().echo
+    message = _m.request_ret_2_message({"int_field": 1, "str_field": "a"})
+    assert benchmark(call, message).int_field == 1
+
+
+@pytest.mark.benchmark(group="remote_method-overhead")
+def test_legacy_call(benchmark, bench_client):
+    """旧实现: 每次调用都解析函数签名 从pb2/pb2_grpc模块中查找message类和stub"""
+    _m = bench_client.bind_method_map["echo"]
+    pb2 = bench_client.get_pb2()
+    stub = bench_client.get_stub()
+
+    def call(*args, **kwargs):
+        arguments = inspect.signature(_m.func).bind(*args, **kwargs).arguments
+        message = getattr(pb2, _m.request_name)()
+        _m.get_plan().request_codec.encode(dict(**arguments), message)
+        result = getattr(stub, "echo")(message)
+        return _m.response_model(**_m.response_message_2_dict(result))
+
+    assert benchmark(call, 1, "a").int_field == 1
+
+
+@pytest.mark.benchmark(group="remote_method-overhead")
+def test_remote_method(benchmark, bench_client):
+    """remote_method: 签名、message类、codec 在第一次调用时缓存"""
+    echo = bench_client.bind_method_map["echo"].func
+    assert benchmark(echo, 1, "a").int_field == 1
+
+
+@pytest.mark.benchmark(group="remote_method-build-request")
+def test_legacy_build_request(benchmark, bench_client):
+    """旧实现: 函数参数 -> CMessage (不含网络)"""
+    _m = bench_client.bind_method_map["echo"]
+    pb2 = bench_client.get_pb2()
+
+    def build(*args, **kwargs):
+        arguments = inspect.signature(_m.func).bind(*args, **kwargs).arguments
+        message = getattr(pb2, _m.request_name)()
+        return _m.get_plan().request_codec.encode(dict(**arguments), message)
+
+    assert benchmark(build, 1, "a").int_field == 1
+
+
+@pytest.mark.benchmark(group="remote_method-build-request")
+def test_build_request(benchmark, bench_client):
+    """调用计划: 函数参数 -> CMessage (不含网络)"""
+    _m = bench_client.bind_method_map["echo"]
+    build = bench_client._build_request
+    assert benchmark(build, _m, (1, "a"), {}).int_field == 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""递归的 dict_to_message/message_to_dict 与 编译后的codec 的对比"""
+import pytest
+
+from grpc_frog.core import proto_type_recorder
+from grpc_frog.core.codec import get_codec
+from tests.benchmark.interface import (
+    BenchModel,
+    NestedModel,
+    RepeatedModel,
+    bench_servicer,
+)
+
+
+def _nested():
+    return NestedModel(name="n", inner=BenchModel(int_field=1), tags={"a": 1, "b": 2})
+
+
+shapes = {
+    "shallow": (BenchModel, lambda: BenchModel(int_field=1, str_field="a")),
+    "nested": (NestedModel, _nested),
+    "repeated": (
+        RepeatedModel,
+        lambda: RepeatedModel(
+            numbers=list(range(1000)), items=[_nested() for _ in range(200)]
+        ),
+    ),
+}
+
+
+def _legacy_roundtrip(model, data):
+    message_class = bench_servicer.get_pb2_message(model.__name__)
+    struct = proto_type_recorder.message_collections[model]
+
+    def roundtrip():
+        message = proto_type_recorder.dict_to_message(
+            data, message_class(), model, bench_servicer
+        )
+        return proto_type_recorder.message_to_dict(message, struct)
+
+    return roundtrip
+
+
+def _codec_roundtrip(model, data):
+    message_class = bench_servicer.get_pb2_message(model.__name__)
+    codec = get_codec(model)
+
+    def roundtrip():
+        return codec.decode(codec.encode(data, message_class()))
+
+    return roundtrip
+
+
+@pytest.mark.parametrize("shape", list(shapes))
+def test_legacy_walker(benchmark, bench_proto_dir, shape):
+    model, make_data = shapes[shape]
+    benchmark.group = "codec-{}".format(shape)
+    result = benchmark(_legacy_roundtrip(model, make_data()))
+    assert result == _codec_roundtrip(model, make_data())()
+
+
+@pytest.mark.parametrize("shape", list(shapes))
+def test_compiled_codec(benchmark, bench_proto_dir, shape):
+    model, make_data = shapes[shape]
+    benchmark.group = "codec-{}".format(shape)
+    result = benchmark(_codec_roundtrip(model, make_data()))
+    assert model(**result) == make_data()
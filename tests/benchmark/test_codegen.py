@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""1000个message的proto 生成model代码(不含格式化)的开销"""
+
+import pytest
+from google.protobuf import descriptor_pb2
+
+from grpc_frog.generator.proto_to_python import PyCodeHelper, _ProtoFile
+
+message_count = 1000
+
+
+def _big_proto() -> descriptor_pb2.FileDescriptorProto:
+    """M0 -> M1 -> ... -> M999 的依赖链(定义顺序与依赖顺序相反) 加一组循环依赖"""
+    _field = descriptor_pb2.FieldDescriptorProto
+    file_proto = descriptor_pb2.FileDescriptorProto(name="big.proto", package="big")
+    for index in range(message_count):
+        message = file_proto.message_type.add(name="M{}".format(index))
+        message.field.add(name="id", number=1, type=_field.TYPE_INT64)
+        if index + 1 < message_count:
+            message.field.add(
+                name="next",
+                number=2,
+                type=_field.TYPE_MESSAGE,
+                type_name=".big.M{}".format(index + 1),
+                label=_field.LABEL_REPEATED,
+            )
+    for name, other in (("CycleA", "CycleB"), ("CycleB", "CycleA")):
+        message = file_proto.message_type.add(name=name)
+        message.field.add(
+            name="other",
+            number=1,
+            type=_field.TYPE_MESSAGE,
+            type_name=".big.{}".format(other),
+        )
+    return file_proto
+
+
+@pytest.fixture(scope="module")
+def helper(tmp_path_factory):
+    return PyCodeHelper(
+        str(tmp_path_factory.mktemp("codegen")), str(tmp_path_factory.mktemp("proto"))
+    )
+
+
+@pytest.mark.benchmark(group="codegen-models")
+def test_models_code(benchmark, helper):
+    proto = _ProtoFile(_big_proto())
+    model_code, models = benchmark(helper._get_models_code, proto)
+    assert len(models) == message_count + 2
+    # 被依赖的model先定义
+    assert model_code.index("class M999(") < model_code.index("class M0(")
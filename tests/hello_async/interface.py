@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""asyncio测试类"""
+
+import asyncio
+import os
+from typing import AsyncIterator
+
+import grpc
+from pydantic import BaseModel
+
+from grpc_frog import frog
+from grpc_frog.core.servicer import Servicer
+
+servicer_name = "hello_async"
+service_async = Servicer(servicer_name)
+frog.add_servicer(service_async)
+
+
+class EchoModel(BaseModel):
+    int_field: int = 0
+    str_field: str = ""
+
+
+@service_async.grpc_method()
+async def async_echo(int_field: int, str_field: str, delay: float) -> EchoModel:
+    await asyncio.sleep(delay)
+    return EchoModel(int_field=int_field + 1, str_field=str_field + "1")
+
+
+@service_async.grpc_method()
+async def async_count(count: int) -> AsyncIterator[EchoModel]:
+    for index in range(count):
+        await asyncio.sleep(0)
+        yield EchoModel(int_field=index)
+
+
+@service_async.grpc_method()
+async def async_bidi(models: AsyncIterator[EchoModel]) -> AsyncIterator[EchoModel]:
+    async for _model in models:
+        yield EchoModel(int_field=_model.int_field * 2)
+
+
+def generate_proto(proto_dir: str) -> str:
+    """生成proto文件"""
+    from grpc_frog import generate_proto_file
+
+    os.makedirs(proto_dir, exist_ok=True)
+    service_async.proto_dir = proto_dir
+    generate_proto_file(servicer_name=servicer_name, save_dir=proto_dir)
+    return proto_dir
+
+
+async def run_aio_server() -> (grpc.aio.Server, str):
+    """在当前事件循环启动aio server 返回server与地址"""
+    server = grpc.aio.server()
+    frog.bind_servicer(server, service_async)
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    return server, "127.0.0.1:{}".format(port)
@@ -5,7 +5,7 @@
 """测试类"""
 import datetime
 import os
-from typing import Dict, List
+from typing import Dict, Iterator, List
 
 import grpc
 from pydantic import BaseModel
@@ -78,6 +78,27 @@ def echo_with_increment_one(
     return res
 
 
+@service_d.grpc_method()
+def echo_stream(count: int) -> Iterator[TDemoModel]:
+    for index in range(count):
+        yield TDemoModel(int_field=index, str_field=str(index))
+
+
+@service_d.grpc_method()
+def sum_stream(models: Iterator[TDemoModel]) -> TDemoModel:
+    total = TDemoModel()
+    for _model in models:
+        total.int_field += _model.int_field
+    return total
+
+
+@service_d.grpc_method()
+def echo_bidi(models: Iterator[TDemoModel]) -> Iterator[TDemoModel]:
+    for _model in models:
+        _model.increment_one()
+        yield _model
+
+
 def generate_proto() -> str:
     """生成proto文件"""
     from grpc_frog import generate_proto_file
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+import asyncio
+import time
+from concurrent import futures
+from typing import AsyncIterator
+
+import grpc
+import pytest
+
+from grpc_frog import frog
+from grpc_frog.core.servicer import Servicer
+from tests.hello_async.interface import (
+    generate_proto,
+    run_aio_server,
+    service_async,
+    servicer_name,
+)
+
+
+@pytest.fixture(scope="module")
+def async_proto_dir(tmp_path_factory):
+    return generate_proto(str(tmp_path_factory.mktemp("hello_async") / "proto"))
+
+
+def test_bind_async_method_to_sync_server(async_proto_dir):
+    from tests.hello_async.interface import EchoModel
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    with pytest.raises(TypeError):
+        frog.bind_servicer(server, service_async)
+
+    # 只有async generator handler的servicer
+    stream_servicer = Servicer("hello_async_stream_only")
+
+    @stream_servicer.grpc_method()
+    async def count(count: int) -> AsyncIterator[EchoModel]:
+        yield EchoModel(int_field=count)
+
+    with pytest.raises(TypeError):
+        frog.bind_servicer(server, stream_servicer)
+
+
+def test_aio_server(async_proto_dir):
+    _m = service_async.bind_method_map["async_echo"]
+    stub_class = getattr(service_async.get_pb2_grpc(), "{}Stub".format(servicer_name))
+
+    async def main():
+        server, address = await run_aio_server()
+        async with grpc.aio.insecure_channel(address) as channel:
+            stub = stub_class(channel)
+
+            async def call(index):
+                message = _m.request_ret_2_message(
+                    {"int_field": index, "str_field": "a", "delay": 0.2}
+                )
+                return _m.response_message_2_dict(await stub.async_echo(message))
+
+            start = time.time()
+            results = await asyncio.gather(*[call(i) for i in range(100)])
+            cost = time.time() - start
+        await server.stop(None)
+        return results, cost
+
+    results, cost = asyncio.run(main())
+    assert [i["int_field"] for i in results] == list(range(1, 101))
+    assert results[0]["str_field"] == "a1"
+    # 100个并发请求在事件循环内同时等待 不受线程数限制
+    assert cost < 2
+
+
+def test_aio_client(async_proto_dir):
+    from tests.hello_async.interface import EchoModel
+
+    client = Servicer(servicer_name, proto_dir=async_proto_dir)
+
+    @client.remote_method()
+    async def async_echo(int_field: int, str_field: str, delay: float) -> EchoModel:
+        ...  # pragma: no cover
+
+    async def main():
+        server, address = await run_aio_server()
+        client.client_init("grpc://{}/{}".format(address, servicer_name))
+        results = await asyncio.gather(
+            *[async_echo(i, "a", delay=0.2) for i in range(50)]
+        )
+        # 同一事件循环中复用同一个aio channel
+        assert len(client._aio_channel_pools) == 1
+        await client.aclose()
+        await server.stop(None)
+        return results
+
+    results = asyncio.run(main())
+    assert [i.int_field for i in results] == list(range(1, 51))
+    assert isinstance(results[0], EchoModel)
+
+
+def test_aio_stream(async_proto_dir):
+    from tests.hello_async.interface import EchoModel
+
+    client = Servicer(servicer_name, proto_dir=async_proto_dir)
+
+    @client.remote_method()
+    async def async_count(count: int) -> AsyncIterator[EchoModel]:
+        ...  # pragma: no cover
+
+    async def main():
+        server, address = await run_aio_server()
+        client.client_init("grpc://{}/{}".format(address, servicer_name))
+        results = [i.int_field async for i in async_count(5)]
+        await client.aclose()
+        await server.stop(None)
+        return results
+
+    assert asyncio.run(main()) == list(range(5))
+
+
+def test_aio_bidi_stream(async_proto_dir):
+    from tests.hello_async.interface import EchoModel
+
+    client = Servicer(servicer_name, proto_dir=async_proto_dir)
+
+    @client.remote_method()
+    async def async_bidi(models: AsyncIterator[EchoModel]) -> AsyncIterator[EchoModel]:
+        ...  # pragma: no cover
+
+    async def models():
+        for index in range(5):
+            yield EchoModel(int_field=index)
+
+    async def main():
+        server, address = await run_aio_server()
+        client.client_init("grpc://{}/{}".format(address, servicer_name))
+        results = [i.int_field async for i in async_bidi(models())]
+        await client.aclose()
+        await server.stop(None)
+        return results
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
+
+
+def test_aio_close(async_proto_dir):
+    from tests.hello_async.interface import EchoModel
+
+    client = Servicer(servicer_name, proto_dir=async_proto_dir)
+
+    @client.remote_method()
+    async def async_echo(int_field: int, str_field: str, delay: float) -> EchoModel:
+        ...  # pragma: no cover
+
+    async def main():
+        server, address = await run_aio_server()
+        client.client_init("grpc://{}/{}".format(address, servicer_name))
+        await async_echo(1, "a", delay=0)
+        channel = client._aio_channel_pools[asyncio.get_running_loop()].get_channel(
+            address
+        )
+        # 同步close 在事件循环中关闭aio channel
+        client.close()
+        await asyncio.sleep(0.1)
+        with pytest.raises(grpc.aio.UsageError):
+            await channel.unary_unary("/a/b")(b"")
+        await server.stop(None)
+
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""client端负载均衡策略"""
+
+import collections
+import random
+
+import pytest
+
+from grpc_frog.core.balancer import create_balancer
+
+servers = [
+    {"host": "10.0.0.1", "port": 1},
+    {"host": "10.0.0.2", "port": 2, "weight": 3},
+    {"host": "10.0.0.3", "port": 3},
+]
+targets = ("10.0.0.1:1", "10.0.0.2:2", "10.0.0.3:3")
+# 权重相同的服务
+equal_servers = [{"host": i["host"], "port": i["port"]} for i in servers]
+
+
+def _count(balancer, times=3000):
+    return collections.Counter(balancer.pick() for _ in range(times))
+
+
+def test_round_robin():
+    balancer = create_balancer("round_robin")
+    balancer.update(servers)
+    assert [balancer.pick() for _ in range(6)] == list(targets) * 2
+
+
+def test_least_outstanding():
+    balancer = create_balancer("least_outstanding")
+    balancer.update(equal_servers)
+    balancer.on_start("10.0.0.1:1")
+    start = balancer.on_start("10.0.0.2:2")
+    assert set(_count(balancer, 100)) == {"10.0.0.3:3"}
+    balancer.on_done("10.0.0.2:2", start)
+    assert set(_count(balancer, 100)) == {"10.0.0.2:2", "10.0.0.3:3"}
+
+
+def test_p2c_ewma():
+    random.seed(1)
+    balancer = create_balancer("p2c_ewma")
+    balancer.update(equal_servers)
+    for target in targets:
+        balancer.on_done(target, balancer.on_start(target))
+    # 10.0.0.1 很慢
+    balancer._latency.update(
+        {"10.0.0.1:1": 1.0, "10.0.0.2:2": 0.01, "10.0.0.3:3": 0.01}
+    )
+    count = _count(balancer)
+    # 抽到的两个target不同 较慢的一方不会被选中
+    assert count["10.0.0.1:1"] == 0
+    assert count["10.0.0.2:2"] > 1000 and count["10.0.0.3:3"] > 1000
+
+
+def test_weighted():
+    random.seed(1)
+    balancer = create_balancer("weighted")
+    balancer.update(servers)
+    count = _count(balancer, 5000)
+    assert 2.5 < count["10.0.0.2:2"] / count["10.0.0.1:1"] < 3.5
+
+
+def test_update():
+    balancer = create_balancer("least_outstanding")
+    balancer.update(servers)
+    start = balancer.on_start("10.0.0.1:1")
+    # 下线的服务不再被选中 请求结束时忽略
+    balancer.update(servers[1:])
+    assert balancer.targets() == targets[1:]
+    balancer.on_done("10.0.0.1:1", start)
+    assert "10.0.0.1:1" not in _count(balancer, 100)
+
+    balancer.update([])
+    with pytest.raises(IndexError):
+        balancer.pick()
+    with pytest.raises(ValueError):
+        create_balancer("unknown")
+
+
+def test_grpc_round_robin_target():
+    balancer = create_balancer("grpc_round_robin")
+    balancer.update(servers)
+    assert balancer.targets() == ("ipv4:10.0.0.1:1,10.0.0.2:2,10.0.0.3:3",)
+    balancer.update([{"host": "::1", "port": 1}, {"host": "fe80::2", "port": 2}])
+    assert balancer.pick() == "ipv6:[::1]:1,[fe80::2]:2"
+    balancer.update([{"host": "localhost", "port": 1}])
+    assert balancer.pick() in ("ipv4:127.0.0.1:1", "ipv6:[::1]:1")
+
+
+def test_reported_load():
+    balancer = create_balancer("weighted")
+    balancer.update(
+        [
+            # 容量用满
+            {"host": "10.0.0.1", "port": 1, "capacity": 10, "inflight": 10},
+            # 4倍的权重 用了一半容量
+            {
+                "host": "10.0.0.2",
+                "port": 2,
+                "weight": 4,
+                "capacity": 64,
+                "inflight": 32,
+            },
+        ]
+    )
+    assert balancer._weights == {"10.0.0.1:1": 0.05, "10.0.0.2:2": 2.0}
+    balancer = create_balancer("p2c_ewma")
+    balancer.update([{"host": "10.0.0.1", "port": 1, "latency_ms": 20}] + servers[2:])
+    # 没有调用过时使用server上报的延迟
+    assert balancer._latency == {"10.0.0.1:1": 0.02, "10.0.0.3:3": 0.0}
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+import asyncio
+
+import grpc
+import pytest
+
+from grpc_frog.core.channel import ChannelPool
+
+
+@pytest.fixture(scope="module")
+def bench_address(tmp_path_factory):
+    from tests.benchmark.interface import generate_proto, run_server
+
+    proto_dir = str(tmp_path_factory.mktemp("channel") / "proto")
+    generate_proto(proto_dir)
+    server, address = run_server()
+    yield address, proto_dir
+    server.stop(None)
+
+
+def test_retain():
+    pool = ChannelPool(lambda channel: channel)
+    old = pool.get_channel("127.0.0.1:1")
+    pool.get_stub("127.0.0.1:2")
+    # 已下线的target被移除 其余连接保持不变
+    pool.retain(["127.0.0.1:2"])
+    assert pool.targets() == ["127.0.0.1:2"]
+    assert pool.get_channel("127.0.0.1:1") is not old
+    pool.close()
+
+
+def test_call_after_close(bench_address):
+    from tests.benchmark.interface import make_client
+
+    client = make_client(*bench_address)
+    echo = client.bind_method_map["echo"].func
+    assert echo(1, "a").int_field == 1
+    client.close()
+    # close之后再次调用时重新建立连接
+    assert echo(2, "b").int_field == 2
+    client.close()
+
+
+def test_servers_changed(bench_address):
+    from tests.benchmark.interface import make_client
+
+    client = make_client(*bench_address)
+    address, _ = bench_address
+    client.get_stub()
+
+    async def main():
+        client.get_aio_stub()
+        # 服务下线 同步和aio的channel都被关闭
+        client._on_servers_changed([])
+        await asyncio.sleep(0.1)
+        pool = client._aio_channel_pools[asyncio.get_running_loop()]
+        return pool.targets()
+
+    assert asyncio.run(main()) == []
+    assert client._channel_pool.targets() == []
+    client.close()
+    assert client._aio_channel_pools == {}
+
+
+def test_warmup(bench_address):
+    from tests.benchmark.interface import BenchModel, make_client
+
+    from grpc_frog.core import codec
+
+    client = make_client(*bench_address)
+    address, _ = bench_address
+    assert BenchModel in codec._codecs
+    timings = client.warmup(connect_timeout=5)
+    assert list(timings) == ["methods", "modules", "codecs", "channels"]
+    assert client._get_channel_pool().targets() == [address]
+    client.close()
+
+
+def test_warmup_timeout(bench_address, caplog):
+    from tests.benchmark.interface import make_client
+
+    _, proto_dir = bench_address
+    client = make_client("127.0.0.1:1", proto_dir)
+    # 连接失败只记录警告 不影响启动
+    client.warmup(connect_timeout=0.1)
+    assert "超时" in caplog.text
+    client.close()
+
+
+def test_grpc_round_robin(bench_address):
+    from tests.benchmark.interface import make_client, run_server
+
+    from grpc_frog.core.resolver import set_memory_servers
+
+    address, proto_dir = bench_address
+    server, other = run_server()
+    set_memory_servers("round_robin_demo", "{},{}".format(address, other))
+    client = make_client(address, proto_dir)
+    client.client_init(
+        "memory://round_robin_demo/frog_bench", lb_policy="grpc_round_robin"
+    )
+    echo = client.bind_method_map["echo"].func
+    # 全部地址共用一个channel
+    assert [echo(i, "a").int_field for i in range(4)] == [0, 1, 2, 3]
+    assert client._get_channel_pool().targets() == ["ipv4:{},{}".format(address, other)]
+    # 服务列表变化时 换成新的channel
+    set_memory_servers("round_robin_demo", other)
+    assert echo(5, "b").int_field == 5
+    assert client._get_channel_pool().targets() == ["ipv4:{}".format(other)]
+    client.close()
+    server.stop(None)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""命令行 generate_proto_file 查找servicer模块"""
+import os
+import sys
+
+from grpc_frog import __main__ as cli
+
+api_code = '''
+import os
+
+from pydantic import BaseModel
+
+from grpc_frog import Servicer, frog
+
+servicer = Servicer("cli_demo", proto_dir=os.path.join(os.path.dirname(__file__), "proto"))
+frog.add_servicer(servicer)
+
+
+@frog.model()
+class Pong(BaseModel):
+    count: int = 0
+
+
+@servicer.grpc_method()
+def ping(count: int) -> Pong:
+    ...
+'''
+
+
+def _make_project(root):
+    package = root / "cli_pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "api.py").write_text(api_code)
+    # 不引用grpc_frog的文件 不会被导入
+    (package / "other.py").write_text("raise RuntimeError('should not import')")
+    # 只在字符串中出现grpc_frog
+    (package / "doc.py").write_text("text = 'grpc_frog'\nraise RuntimeError")
+    venv = root / "env"
+    venv.mkdir()
+    (venv / "pyvenv.cfg").write_text("")
+    (venv / "lib.py").write_text("import grpc_frog\nraise RuntimeError")
+
+
+def test_find_frog_files(tmp_path):
+    _make_project(tmp_path)
+    files = cli._find_frog_files(str(tmp_path))
+    assert files == [str(tmp_path / "cli_pkg" / "api.py")]
+    assert cli._path_to_module(str(tmp_path), files[0]) == "cli_pkg.api"
+
+
+def test_pyproject_modules(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.grpc_frog]\nmodules = ["cli_pkg.api", "cli_pkg.other"]\n'
+    )
+    assert cli._get_pyproject_modules(str(tmp_path)) == [
+        "cli_pkg.api",
+        "cli_pkg.other",
+    ]
+    assert cli._split_modules("a.b, c.py") == ["a.b", "c.py"]
+
+
+def test_generate_proto_file(tmp_path, monkeypatch):
+    _make_project(tmp_path)
+    (tmp_path / "cli_pkg" / "proto").mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    cli.generate_proto_file(servicer_name="cli_demo")
+    assert "cli_pkg.other" not in sys.modules
+    assert os.path.exists(tmp_path / "cli_pkg" / "proto" / "cli_demo_pb2.py")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+import asyncio
+import threading
+
+from grpc_frog import context
+
+
+def test_context_isolated_between_threads():
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def handle(index):
+        token = context.fill("method_{}".format(index), index, None, None, None)
+        # 所有线程都fill之后再读取 确认没有互相覆盖
+        barrier.wait()
+        if context.method != "method_{}".format(index):
+            errors.append(index)
+        context.reset(token)
+        if context.request_message is not None:
+            errors.append(index)
+
+    threads = [threading.Thread(target=handle, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_context_isolated_between_tasks():
+    async def handle(index):
+        token = context.fill("method_{}".format(index), index, None, None, None)
+        await asyncio.sleep(0.01)
+        try:
+            return context.method, context.request_message
+        finally:
+            context.reset(token)
+
+    async def main():
+        return await asyncio.gather(*[handle(i) for i in range(10)])
+
+    results = asyncio.run(main())
+    assert results == [("method_{}".format(i), i) for i in range(10)]
+
+
+def test_context_reset_restores_outer():
+    outer = context.fill("outer", None, None, None, None)
+    inner = context.fill("inner", None, None, None, None)
+    assert context.method == "inner"
+    context.reset(inner)
+    assert context.method == "outer"
+    context.reset(outer)
+    assert context.method is None
+
+
+def test_context_reset_foreign_token():
+    tokens = []
+    thread = threading.Thread(
+        target=lambda: tokens.append(context.fill("A", None, None, None, None))
+    )
+    thread.start()
+    thread.join()
+    token = context.fill("B", None, None, None, None)
+    # 其他线程的token 不影响当前线程正在处理的请求
+    context.reset(tokens[0])
+    assert context.method == "B"
+    context.reset(token)
+    assert context.method is None
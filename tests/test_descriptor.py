@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""in_memory 模式: 不经过protoc 在内存中生成pb2/pb2_grpc"""
+
+import datetime
+import os
+import subprocess
+import sys
+from concurrent import futures
+from typing import Dict, Iterator, List
+
+import grpc
+from pydantic import BaseModel
+
+from grpc_frog import frog
+from grpc_frog.core.servicer import Servicer
+
+servicer_name = "hello_memory"
+
+
+class MemoryItem(BaseModel):
+    int_field: int = 0
+    list_str_field: List[str] = list()
+    create_time: datetime.datetime = datetime.datetime(2021, 1, 1)
+
+
+class MemoryResponse(BaseModel):
+    items: List[MemoryItem] = list()
+    item_map: Dict[str, MemoryItem] = dict()
+    total: float = 0.0
+
+
+def test_in_memory_servicer(tmp_path):
+    service = Servicer(servicer_name, proto_dir=str(tmp_path), in_memory=True)
+    frog.add_servicer(service)
+
+    @service.grpc_method()
+    def collect(items: List[MemoryItem], scale: float) -> MemoryResponse:
+        return MemoryResponse(
+            items=items,
+            item_map={str(i.int_field): i for i in items},
+            total=sum(i.int_field for i in items) * scale,
+        )
+
+    @service.grpc_method()
+    def split(response: MemoryResponse) -> Iterator[MemoryItem]:
+        yield from response.items
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    frog.bind_servicer(server, service)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+
+    client = Servicer(servicer_name, proto_dir=str(tmp_path), in_memory=True)
+
+    @client.remote_method()
+    def collect(
+        items: List[MemoryItem], scale: float
+    ) -> MemoryResponse: ...  # pragma: no cover
+
+    @client.remote_method()
+    def split(response: MemoryResponse) -> Iterator[MemoryItem]: ...  # pragma: no cover
+
+    client.client_init("grpc://127.0.0.1:{}/{}".format(port, servicer_name))
+    try:
+        items = [MemoryItem(int_field=i, list_str_field=["a"]) for i in range(3)]
+        res = collect(items, 2.0)
+        assert res.total == 6.0
+        assert res.items[2].list_str_field == ["a"]
+        assert res.item_map["1"].int_field == 1
+        assert [i.int_field for i in split(res)] == [0, 1, 2]
+    finally:
+        client.close()
+        server.stop(None)
+        del frog.servicer_map[servicer_name]
+    # 没有生成任何文件
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_import_without_protoc():
+    # in_memory 部署不需要grpcio-tools: import grpc_frog 不导入protoc
+    code = "import sys, grpc_frog; assert 'grpc_tools.protoc' not in sys.modules"
+    subprocess.check_call([sys.executable, "-c", code])
@@ -56,3 +56,33 @@ class TestGrpc_frog:
         server.add_insecure_port("127.0.0.1:50055")
         server.start()
         server.stop(None)
+
+    def test_stream_request_conflicts(self):
+        from typing import Iterator
+
+        import pytest
+
+        from grpc_frog import Servicer
+        from tests.hello_d.interface import TDemoModel
+
+        # stream 请求不能再指定request_model
+        servicer = Servicer("stream_conflicts")
+
+        @servicer.grpc_method(TDemoModel, TDemoModel)
+        def with_request_model(models: Iterator[TDemoModel]) -> TDemoModel:
+            ...  # pragma: no cover
+
+        with pytest.raises(NotImplementedError):
+            servicer.resolve_methods()
+
+        # 额外字段无法随 stream 请求发送
+        servicer = Servicer("stream_conflicts")
+        servicer.add_request_extra_field("token", str)
+
+        @servicer.grpc_method()
+        def with_extra_field(models: Iterator[TDemoModel]) -> TDemoModel:
+            ...  # pragma: no cover
+
+        with pytest.raises(NotImplementedError):
+            servicer.resolve_methods()
+
@@ -129,6 +129,26 @@ class TestHello:
         tmp["repeated_model_d"][0] = res.repeated_model_d[0]
         self._asset_response(tmp)
 
+    def test_stream(self):
+        proto_dir = os.path.join(os.path.dirname(__file__), "hello_c", "proto")
+        frog.client_init("grpc://127.0.0.1:50055/hello_d", proto_dir=proto_dir)
+        from tests.hello_c.servicer_hello_d import echo_stream
+
+        res = echo_stream(count=3)
+        assert [i.int_field for i in res] == [0, 1, 2]
+
+    def test_request_stream(self):
+        proto_dir = os.path.join(os.path.dirname(__file__), "hello_c", "proto")
+        frog.client_init("grpc://127.0.0.1:50055/hello_d", proto_dir=proto_dir)
+        from tests.hello_c.model_hello_d import TDemoModel
+        from tests.hello_c.servicer_hello_d import echo_bidi, sum_stream
+
+        # 生成器作为参数 边生成边发送
+        res = sum_stream(TDemoModel(int_field=i) for i in range(100))
+        assert res.int_field == sum(range(100))
+        res = echo_bidi(iter([TDemoModel(int_field=1), TDemoModel(int_field=2)]))
+        assert [i.int_field for i in res] == [2, 3]
+
     def test_zookeeper(self):
         if not _is_port_used("192.168.0.68", 2181):
             return
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""import grpc_frog 时不加载可选依赖"""
+import subprocess
+import sys
+
+# 只在用到时才导入的模块
+lazy_modules = (
+    "flask_sqlalchemy",
+    "sqlalchemy",
+    "kazoo",
+    "grpc_tools.protoc",  # grpc 自身会导入 grpc_tools 包
+    "black",
+    "grpc_frog.zk_utils",
+    "grpc_frog.generator.python_to_proto",
+    "grpc_frog.generator.proto_to_python",
+)
+
+
+def _imported_modules(code: str) -> set:
+    """python -X importtime 输出中导入的模块"""
+    ret = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    modules = set()
+    for line in ret.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def test_import_grpc_frog():
+    modules = _imported_modules("import grpc_frog")
+    assert "grpc_frog.core.servicer" in modules
+    for name in lazy_modules:
+        assert not any(i == name or i.startswith(name + ".") for i in modules), name
+
+
+def test_client_init_without_zookeeper():
+    code = (
+        "from grpc_frog import Servicer\n"
+        "Servicer('import_time_demo').client_init('grpc://127.0.0.1:50051')\n"
+    )
+    modules = _imported_modules(code)
+    assert "kazoo" not in modules
+    assert "flask_sqlalchemy" not in modules
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""method 注册时只记录函数 使用时再解析"""
+import threading
+
+from pydantic import BaseModel
+
+from grpc_frog import Servicer
+from grpc_frog.core import proto_type_recorder, servicer as servicer_module
+
+
+class LazyResponse(BaseModel):
+    value: int = 0
+
+
+def test_lazy_register():
+    service = Servicer("lazy_method")
+
+    @service.grpc_method()
+    def lazy_echo(value: int) -> LazyResponse:
+        ...  # pragma: no cover
+
+    # 注册时不生成request model
+    assert "lazy_echo" in service._pending_methods
+    assert LazyResponse not in proto_type_recorder.message_collections
+
+    _m = service.bind_method_map["lazy_echo"]
+    assert _m.request_name == "lazy_echo_request"
+    assert LazyResponse in proto_type_recorder.message_collections
+    assert not service._pending_methods
+
+
+def test_resolve_once(monkeypatch):
+    service = Servicer("lazy_method_threads")
+    for i in range(20):
+
+        def func(value: int) -> LazyResponse:
+            ...  # pragma: no cover
+
+        func.__name__ = "lazy_{}".format(i)
+        service.grpc_method()(func)
+
+    created = []
+    method_class = servicer_module.Method
+
+    def _method(*args, **kwargs):
+        created.append(args[0].__name__)
+        return method_class(*args, **kwargs)
+
+    monkeypatch.setattr(servicer_module, "Method", _method)
+    threads = [
+        threading.Thread(target=lambda: service.bind_method_map) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(created) == sorted("lazy_{}".format(i) for i in range(20))
+    assert len(service.bind_method_map) == 20
+
+
+def test_bind_arguments():
+    import inspect
+
+    import pytest
+
+    service = Servicer("lazy_method_bind", in_memory=True)
+
+    @service.remote_method()
+    def plain(a: int, b: str, c: int = 3) -> LazyResponse:
+        ...  # pragma: no cover
+
+    @service.remote_method()
+    def keyword_only(a: int, *, b: str = "") -> LazyResponse:
+        ...  # pragma: no cover
+
+    for func, calls in (
+        (plain, [((1, "x"), {}), ((1,), {"b": "x"}), ((), {"b": "x", "a": 1, "c": 5})]),
+        (keyword_only, [((1,), {}), ((1,), {"b": "x"})]),
+    ):
+        _m = service.bind_method_map[func.__name__]
+        sig = inspect.signature(func)
+        for args, kwargs in calls:
+            expect = dict(sig.bind(*args, **kwargs).arguments)
+            assert _m.bind_arguments(args, kwargs) == expect
+
+    _m = service.bind_method_map["plain"]
+    for args, kwargs in (((1,), {}), ((1, "x"), {"a": 2}), ((1, "x"), {"d": 1})):
+        with pytest.raises(TypeError):
+            _m.bind_arguments(args, kwargs)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""proto/pb2 生成: hash缓存 批量编译 并行编译"""
+import os
+
+import pytest
+
+from grpc_frog import generate_proto_file
+
+
+def test_proto_cache(tmp_path, monkeypatch):
+    from grpc_frog.generator import python_to_proto
+    from tests.hello_async.interface import generate_proto, servicer_name
+
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setenv("grpc_frog__proto_cache_dir", cache_dir)
+    proto_dir = generate_proto(str(tmp_path / "a" / "proto"))
+    pb2_file = os.path.join(proto_dir, "{}_pb2.py".format(servicer_name))
+    mtime = os.stat(pb2_file).st_mtime_ns
+
+    def fail(proto_file):
+        raise AssertionError("protoc should not run")
+
+    monkeypatch.setattr(python_to_proto, "generate_pb2_file", fail)
+    # proto内容未变化 不重新编译
+    generate_proto(proto_dir)
+    assert os.stat(pb2_file).st_mtime_ns == mtime
+    # 新目录从共享缓存复制
+    other_dir = generate_proto(str(tmp_path / "b" / "proto"))
+    for name in ["{}.proto", "{}_pb2.py", "{}_pb2_grpc.py"]:
+        assert os.path.exists(os.path.join(other_dir, name.format(servicer_name)))
+
+
+def test_proto_batch(tmp_path, monkeypatch):
+    from grpc_tools import protoc
+
+    from grpc_frog.generator import pb_fiile_util
+    from tests.hello_async.interface import servicer_name
+    from tests.hello_d.interface import service_d
+
+    calls = []
+    protoc_main = protoc.main
+
+    def main(args):
+        calls.append(args)
+        return protoc_main(args)
+
+    monkeypatch.setattr(pb_fiile_util.protoc, "main", main)
+    generate_proto_file(save_dir=str(tmp_path), batch=True)
+    # 同一目录的proto文件只调用一次protoc 不再复制google目录
+    assert len(calls) == 1
+    assert not os.path.exists(tmp_path / "google")
+    for name in [service_d.name, servicer_name]:
+        assert os.path.exists(tmp_path / "{}_pb2.py".format(name))
+        assert os.path.exists(tmp_path / "{}_pb2_grpc.py".format(name))
+
+
+def test_proto_workers(tmp_path):
+    from grpc_frog.generator.pb_fiile_util import generate_pb2_files
+    from tests.hello_async.interface import servicer_name
+    from tests.hello_d.interface import service_d
+
+    generate_proto_file(save_dir=str(tmp_path), workers=2)
+    for name in [service_d.name, servicer_name]:
+        assert os.path.exists(tmp_path / "{}_pb2.py".format(name))
+        assert os.path.exists(tmp_path / "{}_pb2_grpc.py".format(name))
+
+    # 编译失败时报告出错的文件
+    bad_file = tmp_path / "bad.proto"
+    bad_file.write_text('syntax = "proto3";\nmessage Bad {')
+    good_file = str(tmp_path / "{}.proto".format(service_d.name))
+    with pytest.raises(SyntaxError, match="bad.proto"):
+        generate_pb2_files([good_file, str(bad_file)], workers=2)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+import importlib
+import sys
+
+import pytest
+
+from grpc_frog import frog, generate_py_code
+
+shop_proto = """
+syntax = "proto3";
+
+package shop_c;
+
+import "google/protobuf/timestamp.proto";
+
+option java_package = "com.example.shop";
+
+// 订单
+message Order {
+  // 订单中的商品
+  message Item {
+    string sku = 1;  // 商品编号
+    int32 count = 2 [deprecated = true];
+  }
+  enum Status {
+    CREATED = 0;
+    PAID = 1;
+  }
+  int64 order_id = 1;
+  repeated Item items = 2;
+  map<string, Item> item_map = 3;
+  Status status = 4;
+  google.protobuf.Timestamp create_time = 5;
+  double price = 6;
+}
+
+message OrderQuery { int64 order_id = 1; }
+
+service shop_c {
+  // 查询订单
+  rpc get_order(OrderQuery) returns (Order) {}
+  rpc watch_order(OrderQuery) returns (stream Order) {
+    option deprecated = true;
+  }
+}
+"""
+
+
+def test_generate_from_descriptor(tmp_path):
+    proto_dir = tmp_path / "proto_src"
+    proto_dir.mkdir()
+    (proto_dir / "shop_c.proto").write_text(shop_proto, encoding="utf8")
+    package_dir = tmp_path / "shop_c"
+    package_dir.mkdir()
+    generate_py_code(str(package_dir), str(proto_dir))
+
+    sys.path.insert(0, str(tmp_path))
+    try:
+        model = importlib.import_module("shop_c.model_shop_c")
+        importlib.import_module("shop_c.servicer_shop_c")
+    finally:
+        sys.path.remove(str(tmp_path))
+
+    # 嵌套message展开 注释转为docstring
+    assert model.Order.__doc__ == "订单"
+    assert model.Order_Item.__doc__ == "订单中的商品"
+    assert model.Order.__fields__["items"].type_ is model.Order_Item
+    assert model.Order.__fields__["item_map"].type_ is model.Order_Item
+    assert model.Order.__fields__["status"].type_ is int
+    assert model.Order.__fields__["price"].type_ is float
+
+    servicer = frog.servicer_map["shop_c"]
+    get_order = servicer.bind_method_map["get_order"]
+    assert get_order.request_model is model.OrderQuery
+    assert get_order.func.__doc__ == "查询订单"
+    assert servicer.bind_method_map["watch_order"].response_streaming
+
+
+def test_nested_rpc_type(tmp_path):
+    proto_dir = tmp_path / "proto_src"
+    proto_dir.mkdir()
+    (proto_dir / "nested_c.proto").write_text(
+        """
+syntax = "proto3";
+package nested_c;
+message Outer { message Inner { int64 id = 1; } }
+service nested_c { rpc get(Outer.Inner) returns (Outer) {} }
+""",
+        encoding="utf8",
+    )
+    package_dir = tmp_path / "nested_c"
+    package_dir.mkdir()
+    with pytest.raises(NotImplementedError, match="Outer.Inner"):
+        generate_py_code(str(package_dir), str(proto_dir))
+
+
+def _generate(tmp_path, name, proto_text):
+    proto_dir = tmp_path / "proto_src"
+    proto_dir.mkdir()
+    (proto_dir / "{}.proto".format(name)).write_text(proto_text, encoding="utf8")
+    package_dir = tmp_path / name
+    package_dir.mkdir()
+    generate_py_code(str(package_dir), str(proto_dir))
+    sys.path.insert(0, str(tmp_path))
+    try:
+        return importlib.import_module("{}.model_{}".format(name, name))
+    finally:
+        sys.path.remove(str(tmp_path))
+
+
+def test_cyclic_models(tmp_path):
+    from grpc_frog import Servicer
+    from grpc_frog.core import proto_type_recorder
+    from grpc_frog.core.codec import get_codec
+
+    model = _generate(
+        tmp_path,
+        "cycle_c",
+        """
+syntax = "proto3";
+package cycle_c;
+message Tree { Node root = 1; }
+message Node { string name = 1; repeated Node children = 2; Edge parent = 3; }
+message Edge { Node node = 1; map<string, Node> links = 2; }
+""",
+    )
+    # 无环的依赖按拓扑顺序定义 循环依赖解析前向引用后注册
+    assert model.Node.__fields__["children"].type_ is model.Node
+    assert model.Edge.__fields__["node"].type_ is model.Node
+    assert model.Tree.__fields__["root"].type_ is model.Node
+    assert proto_type_recorder.message_collections[model.Node]["children"] == [
+        model.Node
+    ]
+
+    servicer = Servicer("cycle_c", in_memory=True)
+
+    @servicer.grpc_method()
+    def get_tree(name: str) -> model.Tree:
+        ...  # pragma: no cover
+
+    tree = model.Tree(
+        root=model.Node(name="a", children=[model.Node(name="b")]),
+    )
+    codec = get_codec(model.Tree)
+    message = codec.encode(tree, servicer.get_pb2_message("Tree")())
+    assert codec.to_obj(message).root.children[0].name == "b"
+
+
+def test_unknown_dependency(tmp_path, caplog):
+    proto_dir = tmp_path / "proto_src"
+    proto_dir.mkdir()
+    (proto_dir / "unknown_c.proto").write_text(
+        """
+syntax = "proto3";
+package unknown_c;
+message lower_item { int64 id = 1; }
+message Order { lower_item item = 1; int64 id = 2; }
+""",
+        encoding="utf8",
+    )
+    package_dir = tmp_path / "unknown_c"
+    package_dir.mkdir()
+    # 依赖不在生成的model中 给出警告 不会卡死
+    generate_py_code(str(package_dir), str(proto_dir))
+    assert (package_dir / "model_unknown_c.py").exists()
+    assert "lower_item" in caplog.text
+
+
+def test_format_cache(tmp_path):
+    proto_dir = tmp_path / "proto_src"
+    proto_dir.mkdir()
+    for name in ("fmt_a", "fmt_b"):
+        (proto_dir / "{}.proto".format(name)).write_text(
+            'syntax = "proto3";\npackage {0};\nmessage Item {{ int64 id = 1; }}\n'
+            "service {0} {{ rpc get(Item) returns (Item) {{}} }}\n".format(name),
+            encoding="utf8",
+        )
+    package_dir = tmp_path / "fmt_c"
+    package_dir.mkdir()
+    calls = []
+
+    def formatter(code):
+        calls.append(code)
+        return code
+
+    generate_py_code(str(package_dir), str(proto_dir), format=formatter)
+    assert len(calls) == 4
+    model_file = package_dir / "model_fmt_a.py"
+    mtime = model_file.stat().st_mtime_ns
+    # 代码未变化 不重新格式化也不重写文件
+    generate_py_code(str(package_dir), str(proto_dir), format=formatter)
+    assert len(calls) == 4
+    assert model_file.stat().st_mtime_ns == mtime
+
+    # 格式化方式变化时重新生成 4个文件在进程池中用black并行格式化
+    generate_py_code(str(package_dir), str(proto_dir), format="black", workers=2)
+    assert model_file.stat().st_mtime_ns != mtime
+    assert "@frog.model()\nclass Item(BaseModel):" in model_file.read_text("utf8")
+    generate_py_code(str(package_dir), str(proto_dir), format="none")
+    with pytest.raises(ValueError):
+        generate_py_code(str(package_dir), str(proto_dir), format="yapf")
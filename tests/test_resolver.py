@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""client端服务发现"""
+
+import json
+import time
+
+import pytest
+
+from grpc_frog.core import resolver
+from grpc_frog.core.balancer import get_target
+
+
+def _targets(servers):
+    return [get_target(i) for i in servers]
+
+
+def test_parse():
+    assert resolver.parse_uri("grpc://127.0.0.1:5000") == ("grpc", "127.0.0.1:5000", "")
+    assert resolver.get_servicer_name("zookeeper://zk-1:2181/hello_d") == "hello_d"
+    assert resolver.get_servicer_name("file:///etc/servers.json") == ""
+    servers = resolver.parse_hosts("my-host.local:1,[::1]:2, 10.0.0.1:3")
+    assert _targets(servers) == ["my-host.local:1", "[::1]:2", "10.0.0.1:3"]
+    for authority in ("127.0.0.1", "::1:5000", ""):
+        with pytest.raises(ValueError):
+            resolver.parse_hosts(authority)
+    with pytest.raises(ValueError):
+        resolver.create_resolver("unknown://127.0.0.1:1/demo")
+
+
+def test_static_and_dns():
+    static = resolver.create_resolver("static://h-1:1,[fe80::1]:2/demo")
+    assert _targets(static.get_servers()) == ["h-1:1", "[fe80::1]:2"]
+    dns = resolver.create_resolver("dns://localhost:5000/demo")
+    assert set(_targets(dns.get_servers())) <= {"127.0.0.1:5000", "[::1]:5000"}
+    dns.close()
+
+
+def test_memory():
+    resolver.set_memory_servers("resolver_demo", "127.0.0.1:1")
+    memory = resolver.create_resolver("memory://resolver_demo/demo")
+    changes = []
+    memory.add_listener(lambda servers: changes.append(_targets(servers)))
+    assert _targets(memory.get_servers()) == ["127.0.0.1:1"]
+    resolver.set_memory_servers("resolver_demo", "127.0.0.1:1,127.0.0.1:2")
+    assert changes == [["127.0.0.1:1", "127.0.0.1:2"]]
+    # 没有变化时不通知
+    resolver.set_memory_servers("resolver_demo", "127.0.0.1:1,127.0.0.1:2")
+    memory.close()
+    resolver.set_memory_servers("resolver_demo", [])
+    assert len(changes) == 1
+
+
+def test_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(resolver.FileResolver, "interval", 0.02)
+    path = tmp_path / "servers.json"
+    path.write_text(json.dumps([{"host": "10.0.0.1", "port": 1, "weight": 2}]))
+    watcher = resolver.create_resolver("file://{}".format(path))
+    assert watcher.get_servers() == ({"host": "10.0.0.1", "port": 1, "weight": 2},)
+    changes = []
+    watcher.add_listener(changes.append)
+    path.write_text(json.dumps({"servers": [{"host": "10.0.0.2", "port": 2}]}))
+    for _ in range(100):
+        if changes:
+            break
+        time.sleep(0.02)
+    assert _targets(watcher.get_servers()) == ["10.0.0.2:2"]
+    watcher.close()
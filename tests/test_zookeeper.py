@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Copyright 2021 LinkSense Technology CO,. Ltd
+"""zookeeper服务发现 使用进程内的假zookeeper"""
+
+import json
+import time
+
+from kazoo.protocol.states import KazooState
+
+from grpc_frog import zk_utils
+from grpc_frog.core.balancer import get_target, get_weight
+from grpc_frog.core.load import LoadStats
+from grpc_frog.zk_utils import (
+    DistributedChannel,
+    ZkRegistration,
+    get_zk_client,
+    release_zk_client,
+)
+
+
+class FakeZooKeeper:
+    """
+    只实现 DistributedChannel/ZkRegistration 用到的接口
+    节点变化时同步触发watch, 记录读取节点数据的次数
+    create/set 的数据可以直接传dict
+    """
+
+    def __init__(self, hosts=None):
+        self.hosts = hosts
+        self.started = False
+        self.nodes = {}  # path : data
+        self.ephemeral = set()  # 临时节点的path
+        self.listeners = []  # 连接状态的回调
+        self.reads = []  # 被读取数据的path
+        self._children_watches = {}  # path : [func]
+        self._data_watches = {}  # path : [func]
+        self._sequence = 0
+
+    def _children(self, path):
+        prefix = path + "/"
+        return [i[len(prefix) :] for i in self.nodes if i.startswith(prefix)]
+
+    def ChildrenWatch(self, path, func):  # noqa: N802
+        self._children_watches.setdefault(path, []).append(func)
+        func(self._children(path))
+
+    def DataWatch(self, path, func):  # noqa: N802
+        self._data_watches.setdefault(path, []).append(func)
+        self._read(path, func)
+
+    def _read(self, path, func):
+        self.reads.append(path)
+        data = self.nodes.get(path)
+        if func(data, object() if data is not None else None) is False:
+            self._data_watches[path].remove(func)
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        pass
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def expire_session(self):
+        """会话过期 删除临时节点后重新连接"""
+        for path in list(self.ephemeral):
+            self.delete(path)
+        for state in (KazooState.LOST, KazooState.CONNECTED):
+            for listener in list(self.listeners):
+                listener(state)
+
+    def ensure_path(self, path):
+        pass
+
+    def create(self, path, value=b"", ephemeral=False, sequence=False):
+        if sequence:
+            path += "{:010d}".format(self._sequence)
+            self._sequence += 1
+        self.nodes[path] = _encode(value)
+        if ephemeral:
+            self.ephemeral.add(path)
+        self._fire_children(path)
+        return path
+
+    def set(self, path, value):
+        self.nodes[path] = _encode(value)
+        for func in list(self._data_watches.get(path, [])):
+            self._read(path, func)
+
+    def delete(self, path):
+        del self.nodes[path]
+        self.ephemeral.discard(path)
+        self._fire_children(path)
+        for func in list(self._data_watches.get(path, [])):
+            self._read(path, func)
+
+    def _fire_children(self, path):
+        parent = path.rsplit("/", 1)[0]
+        for func in list(self._children_watches.get(parent, [])):
+            func(self._children(parent))
+
+
+def _encode(value):
+    return value if isinstance(value, bytes) else json.dumps(value).encode()
+
+
+def test_incremental_update():
+    zk = FakeZooKeeper()
+    zk.create("/zk_demo/a", {"host": "10.0.0.1", "port": 1})
+    zk.create("/zk_demo/b", {"host": "10.0.0.2", "port": 2})
+    channel = DistributedChannel(None, None, "zk_demo", zk_client=zk)
+    changes = []
+    channel.add_listener(
+        lambda servers: changes.append([get_target(i) for i in servers])
+    )
+    assert channel.get_targets() == ["10.0.0.1:1", "10.0.0.2:2"]
+    snapshot = channel._servers
+
+    # 新增节点 只读取新节点的数据
+    zk.reads.clear()
+    zk.create("/zk_demo/c", {"host": "10.0.0.3", "port": 3})
+    assert zk.reads == ["/zk_demo/c"]
+    assert changes[-1] == ["10.0.0.1:1", "10.0.0.2:2", "10.0.0.3:3"]
+    # 已发布的快照不会被修改
+    assert len(snapshot) == 2
+
+    # 下线节点 直接从缓存删除 不再读取其他节点
+    zk.reads.clear()
+    zk.delete("/zk_demo/a")
+    assert zk.reads == ["/zk_demo/a"]
+    assert changes[-1] == ["10.0.0.2:2", "10.0.0.3:3"]
+    assert not zk._data_watches["/zk_demo/a"]
+
+    # 节点数据变化
+    zk.set("/zk_demo/b", {"host": "10.0.0.4", "port": 4})
+    assert channel.get_targets() == ["10.0.0.4:4", "10.0.0.3:3"]
+    assert channel.get_server() in (
+        {"host": "10.0.0.4", "port": 4},
+        {"host": "10.0.0.3", "port": 3},
+    )
+    assert len(changes) == 3
+
+
+def test_registration_report_load():
+    zk = FakeZooKeeper()
+    stats = LoadStats()
+    data = {"host": "10.0.0.1", "port": 1, "weight": 2, "capacity": 10}
+    # 测试中手动上报 不等待后台线程
+    registration = ZkRegistration(
+        zk, "zk_demo", data, load_stats=stats, report_interval=3600
+    )
+    channel = DistributedChannel(None, None, "zk_demo", zk_client=zk)
+    assert channel.get_servers() == (data,)
+
+    starts = [stats.on_start() for _ in range(5)]
+    assert registration.report() is True
+    server = channel.get_servers()[0]
+    assert server["inflight"] == 5
+    assert get_weight(server) == 1.0  # 剩余一半容量
+
+    # 负载没有变化时不写入
+    assert registration.report() is False
+    for start in starts:
+        stats.on_done(start)
+    assert registration.report() is True
+    assert channel.get_servers()[0]["inflight"] == 0
+
+    registration.close()
+    assert channel.get_servers() == ()
+
+
+def test_shared_client(monkeypatch):
+    monkeypatch.setattr(zk_utils, "KazooClient", FakeZooKeeper)
+    # 同一个集群 地址顺序不同也共用一个会话
+    zk = get_zk_client("10.0.0.2:2181,10.0.0.1:2181")
+    assert zk.started
+    channel = DistributedChannel("10.0.0.1:2181,10.0.0.2:2181", None, "zk_demo")
+    registration = zk_utils.register_zk("10.0.0.3", 3, "zk_demo", "10.0.0.1", 2181)
+    assert channel._zk is zk
+    assert get_zk_client("10.0.0.1:2181") is not zk
+    release_zk_client(zk_utils._clients["10.0.0.1:2181"][0])
+
+    # 全部使用者释放后才关闭会话
+    registration.close()
+    channel.close()
+    assert zk.started
+    release_zk_client(zk)
+    assert not zk.started
+    assert not zk_utils._clients
+
+
+def test_session_restore():
+    zk = FakeZooKeeper()
+    stats = LoadStats()
+    registration = ZkRegistration(
+        zk, "zk_demo", {"host": "10.0.0.1", "port": 1}, load_stats=stats
+    )
+    channel = DistributedChannel(None, None, "zk_demo", zk_client=zk)
+    start = stats.on_start()
+    registration.report()
+    old_path = registration.path
+
+    # 会话过期后临时节点被删除 重新连接时重新注册 保留上报的负载
+    zk.expire_session()
+    deadline = time.time() + 5
+    while registration.path == old_path and time.time() < deadline:
+        time.sleep(0.01)
+    assert registration.path != old_path
+    assert channel.get_servers() == (
+        {"host": "10.0.0.1", "port": 1, "inflight": 1, "latency_ms": 0.0},
+    )
+    stats.on_done(start)
+
+    registration.close()
+    assert not zk.nodes and not zk.listeners